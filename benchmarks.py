@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Time the candybar and astrolabe hot paths.
+
+    python benchmarks.py --repeat 5 --years 2020-2029 --output output/benchmarks.json
+
+Every benchmark is run --repeat times for timing and once more under
+tracemalloc for peak memory. Candybar benchmarks run with the week cache
+disabled, a fresh new moon table and an empty astronomy memo, so they
+measure the computation rather than a cache lookup. Results are written as
+JSON with the median, mean, standard deviation, min and max of the
+wall-clock times in seconds, along with the byte sizes of the full and
+compact astrolabe SVGs.
+"""
+
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import click
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import astronomy
+from calendrical_tools import candybar
+from calendrical_tools import cursor
+from calendrical_tools import ecliptic
+from calendrical_tools import generate_astrolabe
+from calendrical_tools import lunations
+from calendrical_tools import plates
+from calendrical_tools import yearindex
+
+
+def parse_years(years):
+    start, _, end = years.partition("-")
+    return list(range(int(start), int(end or start) + 1))
+
+
+def cold():
+    """Drop the shared new moon table and astronomy memo."""
+    lunations.default_table = None
+    astronomy.get_default_memo().clear()
+
+
+def cold_candybar(cls, year, **kwargs):
+    cold()
+    return cls(year, cache=False, **kwargs)
+
+
+def candybar_benchmarks(years):
+    span = "{}-{}".format(years[0], years[-1]) if len(years) > 1 else str(years[0])
+    benchmarks = {}
+
+    for cal_type in candybar.CandyBar.calendar_types:
+
+        def construct(cal_type=cal_type):
+            for year in years:
+                cold_candybar(candybar.CandyBar, year, calendars=[cal_type]).weeks[
+                    cal_type
+                ]
+
+        benchmarks["CandyBar[{}] {}".format(cal_type, span)] = (None, construct)
+
+    def isoweeks():
+        cal = candybar.CandyBar(years[0], cache=False)
+        for year in years:
+            cal.isoweeks(year)
+
+    benchmarks["isoweeks " + span] = (None, isoweeks)
+
+    def new_moons_in_year():
+        cold()
+        cal = candybar.CandyBar(years[0], cache=False)
+        for year in years:
+            cal.new_moons_in_year(year)
+
+    benchmarks["new_moons_in_year " + span] = (None, new_moons_in_year)
+
+    for cal_type in candybar.CandyBar.calendar_types:
+
+        def setup():
+            cals = [candybar.CandyBar(year, cache=False) for year in years]
+            return [(cal.window()[0], cal.new_moons) for cal in cals]
+
+        def weeks_data(data, cal_type=cal_type):
+            cal = candybar.CandyBar(years[0], cache=False)
+            for wks, new_moons in data:
+                cal.weeks_data(wks=wks, new_moons=new_moons, calendar_type=cal_type)
+
+        benchmarks["weeks_data[{}] {}".format(cal_type, span)] = (setup, weeks_data)
+
+    for cal_type in cursor.cursors:
+        benchmarks["cursor.columns[{}] {}".format(cal_type, span)] = (
+            None,
+            lambda cal_type=cal_type: cursor.cursor(
+                cal_type, pcc.fixed_from_gregorian([years[0], 1, 1])
+            ).columns(366 * len(years)),
+        )
+
+    for cal_type in yearindex.structures:
+
+        def year_index(cal_type=cal_type):
+            yearindex.YearIndex(cal_type, years[0], years[-1])
+
+        benchmarks["YearIndex[{}] {}".format(cal_type, span)] = (None, year_index)
+
+    def latex_setup():
+        cals = [candybar.LaTeXCandyBar(year, cache=False) for year in years]
+        return [(cal, {c: cal.weeks[c] for c in cal.calendars}) for cal in cals]
+
+    def prweeks(data):
+        for cal, weeks in data:
+            # Week views are rebuilt on each pass, so formatweek's appends to
+            # their day lists do not carry over between runs.
+            for cal_type in cal.calendars:
+                cal.prweeks(weeks[cal_type], cal.new_moons)
+
+    benchmarks["LaTeXCandyBar.prweeks " + span] = (latex_setup, prweeks)
+
+    def svg_setup():
+        cal = candybar.SvgCandyBar()
+        cal.weeks["gregorian"], cal.weeks["chinese"]
+        return cal
+
+    benchmarks["SvgCandyBar.prcandybar 2020"] = (
+        svg_setup,
+        lambda cal: cal.prcandybar(),
+    )
+    return benchmarks
+
+
+def astrolabe_benchmarks():
+    benchmarks = {}
+    Astrolabe = generate_astrolabe.Astrolabe
+
+    def cold_plates():
+        plates.default_cache = None
+
+    # Construction reads plate geometry from the shared PlateCache; the cold
+    # run starts from an empty one, the cached run from a filled one.
+    benchmarks["Astrolabe.__init__"] = (cold_plates, lambda _: Astrolabe())
+    benchmarks["Astrolabe.__init__ cached"] = (Astrolabe, lambda _: Astrolabe())
+
+    for step in (30, 10, 2):
+
+        def divisions(astrolabe, step=step):
+            for angle in range(0, 361, step):
+                astrolabe.ecliptic_division(angle)
+
+        benchmarks["Astrolabe.ecliptic_division {}deg".format(step)] = (
+            Astrolabe,
+            divisions,
+        )
+        benchmarks["Astrolabe.ecliptic_divisions {}deg".format(step)] = (
+            Astrolabe,
+            lambda astrolabe, step=step: astrolabe.ecliptic_divisions(
+                range(0, 361, step)
+            ),
+        )
+
+    for step in (0.5, 0.05):
+        benchmarks["EclipticScale.graduations {}deg".format(step)] = (
+            None,
+            lambda step=step: ecliptic.EclipticScale().graduations(step),
+        )
+
+    latitudes = [1 + 65 * i / 999 for i in range(1000)]
+    benchmarks["plates.plate_geometry 1000 latitudes"] = (
+        None,
+        lambda: plates.plate_geometry(latitudes),
+    )
+
+    def render_plates():
+        with tempfile.TemporaryDirectory() as tmp:
+            plates.render_plates(plates.plate_geometry(latitudes), directory=tmp)
+
+    benchmarks["plates.render_plates 1000 latitudes"] = (None, render_plates)
+
+    def render():
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                generate_astrolabe.main()
+            finally:
+                os.chdir(cwd)
+
+    benchmarks["generate_astrolabe.main"] = (None, render)
+
+    # Parsing stands in for the browser's work; the hand-written script at
+    # the end of the SVG is not well-formed XML, so only the drawing is parsed.
+    for label, precision in (("full", None), ("compact", 2)):
+        benchmarks["generate_astrolabe.render " + label] = (
+            None,
+            lambda precision=precision: generate_astrolabe.render(2020, precision),
+        )
+        benchmarks["parse astrolabe SVG " + label] = (
+            lambda precision=precision: drawing(
+                generate_astrolabe.render(2020, precision)
+            ),
+            ET.fromstring,
+        )
+    return benchmarks
+
+
+def drawing(svg):
+    return svg[: svg.index('<text id="output"')] + "</svg>"
+
+
+def svg_sizes():
+    sizes = {}
+    for label, precision in (("full", None), ("compact", 2)):
+        svg = generate_astrolabe.render(2020, precision)
+        sizes[label] = {
+            "bytes": len(svg.encode()),
+            "elements": sum(1 for _ in ET.fromstring(drawing(svg)).iter()),
+        }
+    return sizes
+
+
+def run(name, setup, func, repeat):
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "repeat": repeat,
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "variance": statistics.variance(times) if len(times) > 1 else 0.0,
+        "min": min(times),
+        "max": max(times),
+        "peak_memory_bytes": peak,
+    }
+
+
+@click.command()
+@click.option("--repeat", default=5, help="Timed runs per benchmark.")
+@click.option(
+    "--years",
+    "year_spans",
+    default=["2020", "2020-2029"],
+    multiple=True,
+    help="Year or START-END span for the candybar benchmarks; may be repeated.",
+)
+@click.option(
+    "--only",
+    default=None,
+    help="Only run benchmarks whose name contains this.",
+)
+@click.option("--output", default="output/benchmarks.json", help="JSON results file.")
+def main(repeat, year_spans, only, output):
+    benchmarks = {}
+    for span in year_spans:
+        benchmarks.update(candybar_benchmarks(parse_years(span)))
+    benchmarks.update(astrolabe_benchmarks())
+
+    results = []
+    for name, (setup, func) in benchmarks.items():
+        if only is not None and only not in name:
+            continue
+        result = run(name, setup, func, repeat)
+        results.append(result)
+        click.echo(
+            "{:<45} {:10.4f}s median  {:8.4f}s stdev  {:10.1f} KiB peak".format(
+                name,
+                result["median"],
+                result["stdev"],
+                result["peak_memory_bytes"] / 1024,
+            )
+        )
+
+    sizes = svg_sizes()
+    for label, size in sizes.items():
+        click.echo(
+            "astrolabe SVG {:<31} {:10d} bytes  {:8d} elements".format(
+                label, size["bytes"], size["elements"]
+            )
+        )
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+        "astrolabe_svg": sizes,
+    }
+    with open(output, "w") as fp:
+        json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""A precomputed almanac file, read through mmap.
+
+The almanac holds, for every fixed day in a span of Gregorian years, the
+date in each calendar as int16 columns (the layout DayTable uses), and the
+moment of every new moon in the span as float64, indexed by lunation number
+as in lunations.NewMoonTable. It is built once:
+
+    python -m calendrical_tools.almanac --start 1600 --end 2400 --output output/almanac.bin
+
+and then read without computing any astronomy. An Almanac maps the file the
+first time it is used, not when it is created, and its arrays are read-only
+NumPy views straight onto the mapping, so opening it costs nothing up front
+and every process that maps the same file shares the same pages of the OS
+page cache.
+
+    cal = CandyBar(2020, almanac="output/almanac.bin")
+
+The file is a fixed magic string, the length of a JSON header, the header
+(the span and each array's dtype, shape and offset), and the arrays, each
+starting on a 64-byte boundary.
+"""
+
+import json
+import mmap
+import struct
+
+import click
+import numpy as np
+
+from calendrical_tools import batch
+from calendrical_tools import instrument
+from calendrical_tools import lunations
+
+magic = b"CTALMNC1"
+alignment = 64
+calendar_types = ["gregorian", "hebrew", "islamic", "chinese"]
+# Days kept either side of the span, so that the candybar windows of its
+# first and last years (which start weeks before January 1 and can end
+# after December 31) are inside the file.
+padding = 7 * 12
+
+
+def _aligned(n):
+    return -(-n // alignment) * alignment
+
+
+def layout(start, end, first_lunation, lunation_count, calendars):
+    """The header of an almanac of days start..end-1, with array offsets."""
+    arrays = {}
+    offset = 0
+    for cal in calendars:
+        arrays[cal] = {
+            "dtype": "<i2",
+            "shape": [len(batch.column_names[cal]), end - start],
+            "offset": offset,
+        }
+        offset = _aligned(offset + 2 * len(batch.column_names[cal]) * (end - start))
+    arrays["moments"] = {"dtype": "<f8", "shape": [lunation_count], "offset": offset}
+    return {
+        "start": start,
+        "end": end,
+        "first_lunation": first_lunation,
+        "calendars": list(calendars),
+        "arrays": arrays,
+    }
+
+
+def _data_start(header_bytes):
+    return _aligned(len(magic) + 4 + len(header_bytes))
+
+
+def build(path, start_year=1600, end_year=2400, calendars=None, chunk=65536):
+    """
+    Write the almanac for Gregorian years start_year..end_year, plus padding
+    days either side, to path. Days are converted a chunk at a time and
+    written through a writable memmap, so memory stays bounded by the chunk.
+    Returns the header.
+    """
+    if calendars is None:
+        calendars = calendar_types
+    start = int(batch.fixed_from_gregorian(start_year, 1, 1)) - padding
+    end = int(batch.fixed_from_gregorian(end_year + 1, 1, 1)) + padding
+    with instrument.span("almanac.new_moons"):
+        numbers, moments = lunations.NewMoonTable(
+            start_year - 1, end_year + 1
+        ).between(start, end)
+    header = layout(start, end, int(numbers[0]), len(numbers), calendars)
+    header["start_year"], header["end_year"] = start_year, end_year
+    header_bytes = json.dumps(header).encode()
+    data_start = _data_start(header_bytes)
+    moments_spec = header["arrays"]["moments"]
+    size = data_start + moments_spec["offset"] + 8 * len(numbers)
+
+    with open(path, "wb") as fp:
+        fp.write(magic + struct.pack("<I", len(header_bytes)) + header_bytes)
+        fp.truncate(size)
+
+    def view(name):
+        spec = header["arrays"][name]
+        return np.memmap(
+            path,
+            dtype=spec["dtype"],
+            mode="r+",
+            offset=data_start + spec["offset"],
+            shape=tuple(spec["shape"]),
+        )
+
+    columns = {cal: view(cal) for cal in calendars}
+    with instrument.span("almanac.days"):
+        for converted in batch.convert_range(start, end, calendars, chunk):
+            i = int(converted["fixed"][0]) - start
+            j = i + len(converted["fixed"])
+            for cal in calendars:
+                columns[cal][:, i:j] = np.array(converted[cal], dtype=np.int16)
+    view("moments")[:] = moments
+    for array in columns.values():
+        array.flush()
+    return header
+
+
+class Almanac:
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._header = None
+        self._arrays = {}
+
+    def _open(self):
+        with open(self.path, "rb") as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(magic)] != magic:
+            raise ValueError("%s is not an almanac file" % self.path)
+        (length,) = struct.unpack_from("<I", self._map, len(magic))
+        header_bytes = self._map[len(magic) + 4 : len(magic) + 4 + length]
+        header = json.loads(header_bytes)
+        data_start = _data_start(header_bytes)
+        for name, spec in header["arrays"].items():
+            self._arrays[name] = np.frombuffer(
+                self._map,
+                dtype=spec["dtype"],
+                count=int(np.prod(spec["shape"])),
+                offset=data_start + spec["offset"],
+            ).reshape(spec["shape"])
+        self._header = header
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._open()
+        return self._header
+
+    def array(self, name):
+        self.header
+        return self._arrays[name]
+
+    def covers(self, start, end, calendar_type=None):
+        """Whether fixed dates start..end-1 (and calendar_type) are in the file."""
+        header = self.header
+        if calendar_type is not None and calendar_type not in header["calendars"]:
+            return False
+        return header["start"] <= start <= end <= header["end"]
+
+    def columns(self, calendar_type, start, end):
+        """
+        View of calendar_type's columns for fixed dates start..end-1, as
+        batch.from_fixed_functions returns them.
+        """
+        header = self.header
+        if calendar_type not in header["calendars"]:
+            raise ValueError("%s has no %s columns" % (self.path, calendar_type))
+        if not self.covers(start, end):
+            raise ValueError(
+                "days {} to {} are outside the almanac for years {} to {}".format(
+                    start, end, header["start_year"], header["end_year"]
+                )
+            )
+        i = start - header["start"]
+        return self.array(calendar_type)[:, i : i + end - start]
+
+    def between(self, a, b):
+        """
+        Lunation numbers and moments of the new moons with a <= moment < b,
+        like NewMoonTable.between.
+        """
+        header = self.header
+        if not self.covers(a, b):
+            raise ValueError(
+                "days {} to {} are outside the almanac for years {} to {}".format(
+                    a, b, header["start_year"], header["end_year"]
+                )
+            )
+        moments = self.array("moments")
+        i = np.searchsorted(moments, a, side="left")
+        j = np.searchsorted(moments, b, side="left")
+        first = header["first_lunation"]
+        return np.arange(first + i, first + j), moments[i:j]
+
+    def close(self):
+        if self._map is not None:
+            self._arrays = {}
+            self._header = None
+            self._map.close()
+            self._map = None
+
+
+almanacs = {}
+
+
+def get_almanac(path):
+    """The shared Almanac for path. The file is not opened until it is used."""
+    if path not in almanacs:
+        almanacs[path] = Almanac(path)
+    return almanacs[path]
+
+
+@click.command()
+@click.option("--start", default=1600, help="First Gregorian year.")
+@click.option("--end", default=2400, help="Last Gregorian year.")
+@click.option(
+    "--calendar",
+    "calendars",
+    multiple=True,
+    type=click.Choice(calendar_types),
+    help="Calendar to include; may be repeated. Defaults to all.",
+)
+@click.option("--chunk", default=65536, help="Days converted per chunk.")
+@click.option("--output", default="output/almanac.bin", help="Almanac file.")
+def main(start, end, calendars, chunk, output):
+    header = build(output, start, end, list(calendars) or None, chunk)
+    click.echo(
+        "{} days and {} new moons written to {}".format(
+            header["end"] - header["start"],
+            header["arrays"]["moments"]["shape"][0],
+            output,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Memoized pycalcal astronomy.
+
+The functions here are pycalcal's expensive astronomical primitives behind a
+process-wide, size-bounded memo, so candybars for several calendars or
+adjacent years share their new moons, solstices and solar terms instead of
+recomputing them. The least recently used results are dropped once the memo
+holds capacity of them.
+
+A Memo can also be given a persistent store (see open_store), a shelve file
+that outlives the process. A store is keyed to the pycalcal source, so it is
+emptied when pycalcal changes. Shelve files do not support concurrent
+writers, so do not share one store between processes.
+"""
+
+import collections
+import functools
+import shelve
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import cache as cachemod
+from calendrical_tools import instrument
+
+_missing = object()
+
+
+class Memo:
+    def __init__(self, capacity=65536, store=None):
+        self.capacity = capacity
+        self.store = store
+        self.entries = collections.OrderedDict()
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0, "evictions": 0}
+
+    def call(self, func, *args):
+        key = (func.__name__,) + args
+        value = self.entries.get(key, _missing)
+        if value is not _missing:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            instrument.count("astronomy.hits")
+            return value
+
+        if self.store is not None:
+            value = self.store.get(repr(key), _missing)
+        if value is not _missing:
+            self.stats["store_hits"] += 1
+            instrument.count("astronomy.store_hits")
+        else:
+            value = func(*args)
+            self.stats["misses"] += 1
+            instrument.count("astronomy.misses")
+            instrument.count("pycalcal." + func.__name__)
+            if self.store is not None:
+                self.store[repr(key)] = value
+
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            instrument.count("astronomy.evictions")
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def report(self):
+        return (
+            "astronomy memo ({} of {}): {hits} hits, {store_hits} store hits, "
+            "{misses} misses, {evictions} evictions"
+        ).format(len(self.entries), self.capacity, **self.stats)
+
+
+def open_store(path):
+    """Open (creating if needed) a shelve store for a Memo."""
+    store = shelve.open(str(path))
+    version = cachemod.source_hash(pcc.__file__)
+    if store.get("__version__") != version:
+        store.clear()
+        store["__version__"] = version
+    return store
+
+
+default_memo = None
+
+
+def get_default_memo():
+    global default_memo
+    if default_memo is None:
+        default_memo = Memo()
+    return default_memo
+
+
+def configure(capacity=65536, store_path=None):
+    """Replace the shared memo, e.g. to change its capacity or add a store."""
+    global default_memo
+    if default_memo is not None:
+        default_memo.close()
+    store = open_store(store_path) if store_path is not None else None
+    default_memo = Memo(capacity=capacity, store=store)
+    return default_memo
+
+
+def memoized(func):
+    @functools.wraps(func)
+    def wrapper(*args):
+        return get_default_memo().call(func, *args)
+
+    return wrapper
+
+
+nth_new_moon = memoized(pcc.nth_new_moon)
+solar_longitude = memoized(pcc.solar_longitude)
+lunar_longitude = memoized(pcc.lunar_longitude)
+lunar_latitude = memoized(pcc.lunar_latitude)
+sidereal_lunar_longitude = memoized(pcc.sidereal_lunar_longitude)
+current_major_solar_term = memoized(pcc.current_major_solar_term)
+is_chinese_no_major_solar_term = memoized(pcc.is_chinese_no_major_solar_term)
+chinese_new_moon_before = memoized(pcc.chinese_new_moon_before)
+chinese_new_moon_on_or_after = memoized(pcc.chinese_new_moon_on_or_after)
+chinese_winter_solstice_on_or_before = memoized(
+    pcc.chinese_winter_solstice_on_or_before
+)
+molad = memoized(pcc.molad)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""A set of plates in one document, sharing everything but the plates.
+
+The astrolabe is rendered once, and its latitude-independent parts (the
+styles, symbols and clip paths, the mater with the tropics, and the limb and
+rete) are put in the atlas's defs. Each plate then adds only its horizon,
+almucantar, azimuth and prime vertical circles, and draws the shared parts
+with <use>. Plates are written to the file one at a time, so the document is
+never held in memory as a whole, and its size grows only by the plate
+circles per extra plate.
+
+    python -m calendrical_tools.atlas --output output/climata.svg
+    python -m calendrical_tools.atlas --format html --output output/climata.html
+
+The default plates are the seven classic climata.
+"""
+
+import math
+import re
+
+import click
+from jinja2 import Template
+
+from calendrical_tools import generate_astrolabe
+from calendrical_tools import instrument
+from calendrical_tools import svgcompact
+
+# One astrolabe in the template's coordinates spans -125 to 125.
+cell_size = 250
+
+astrolabe_defs = re.compile(r"<defs>(.*?)</defs>", re.DOTALL)
+plate_clip_paths = re.compile(
+    r'\s*<clipPath id="(?:Horizon|almucantarHole)">.*?</clipPath>', re.DOTALL
+)
+front_end = re.compile(r'<g transform="scale\(1, -1\)">\s*<use xlink:href="#yellow_path"')
+
+atlas_head = Template(
+    """<svg id="atlas" viewBox="0 0 {{ width }} {{ height }}" width="{{ width }}" height="{{ height }}"
+	xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+	xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape">
+	<g id="astrolabe">
+	<defs>
+		{{ defs }}
+		<style type="text/css">
+			#tropics, #azimuth, #primeVertical {
+			  clip-path: none;
+			}
+		</style>
+		<g id="mater">
+			<rect id="background_rectangle" x="-125" y="-125" width="250" height="250"/>
+			<g id="tropics">
+				<circle cx="0" cy="0" r="{{ RCapricorn }}"/>
+				<circle cx="0" cy="0" r="{{ REquator }}"/>
+				<circle cx="0" cy="0" r="{{ RCancer }}"/>
+			</g>
+			<g id="axisGroup">
+				<line x1="0" y1="{{ -RCapricorn }}" x2="0" y2="{{ RCapricorn }}"/>
+				<line x1="{{ -RCapricorn }}" y1="0" x2="{{ RCapricorn }}" y2="0"/>
+			</g>
+		</g>
+		<g id="front">
+		{{ front }}
+		</g>
+	</defs>
+"""
+)
+
+atlas_plate = Template(
+    """
+	<g id="plate{{ n }}" transform="translate({{ x }}, {{ y }}) scale(1, -1)">
+		<title>{{ location }}</title>
+		<use xlink:href="#mater"/>
+		<clipPath id="horizon{{ n }}">
+			<circle cx="{{ horiz.cx }}" cy="{{ horiz.cy }}" r="{{ horiz.r }}"/>
+		</clipPath>
+		<g clip-path="url(#Capricorn)">
+			<circle id="horizon" cx="{{ horiz.cx }}" cy="{{ horiz.cy }}" r="{{ horiz.r }}"/>
+			<g clip-path="url(#horizon{{ n }})">
+			{%- for coord in almucantar_coords %}
+				<circle id="almucantar" alt="{{ coord.alt }}" cx="{{ coord.cx }}" cy="{{ coord.cy }}" r="{{ coord.r }}"/>
+			{%- endfor %}
+			{%- for coord in azimuth_coords %}
+				<circle id="azimuth" az="{{ coord.az }}" cx="{{ coord.cx }}" cy="{{ coord.cy }}" r="{{ coord.r }}"/>
+			{%- endfor %}
+				<circle id="primeVertical" cx="{{ prime_vertical.cx }}" cy="{{ prime_vertical.cy }}" r="{{ prime_vertical.r }}"/>
+			</g>
+		</g>
+		<g transform="scale(1, -1)">
+			<text id="description" x="0" y="{{ RCapricorn - 19 }}">
+				{{ location }}
+				<tspan x="0" dy="1.2em">{{ latitude }}</tspan>
+			</text>
+		</g>
+		<use xlink:href="#front"/>
+	</g>"""
+)
+
+atlas_tail = """
+	</g>
+</svg>
+"""
+
+
+class AtlasLayers:
+    """The latitude-independent parts of a rendered astrolabe SVG."""
+
+    def __init__(self, svg):
+        defs = astrolabe_defs.search(svg)
+        start = svg.find('<g id="limb"')
+        end = front_end.search(svg)
+        if defs is None or start < 0 or end is None:
+            raise ValueError("unexpected astrolabe SVG layout")
+        self.defs = plate_clip_paths.sub("", defs.group(1))
+        self.front = svg[start : end.start()].rstrip()
+
+
+def html_shell():
+    """astrolabe_template.html.j2 split around where the SVG goes."""
+    import jinja2
+
+    marker = "<!-- atlas -->"
+    env = jinja2.Environment(loader=jinja2.PackageLoader("calendrical_tools", "."))
+    env.globals["include_file"] = lambda name: marker
+    head, _, tail = env.get_template("astrolabe_template.html.j2").render().partition(
+        marker
+    )
+    return head, tail
+
+
+def write_atlas(
+    fp, locations=None, year=2020, precision=None, columns=None, html=False
+):
+    """
+    Write an atlas of plates for locations, a dict of name to latitude
+    (default the climata), to the open file fp, columns plates to a row.
+    Returns the number of plates.
+    """
+    astrolabe = generate_astrolabe.Astrolabe()
+    if locations is None:
+        locations = dict(astrolabe.climata)
+    names = list(locations)
+    if columns is None:
+        columns = math.ceil(math.sqrt(len(names)))
+    rows = math.ceil(len(names) / columns)
+
+    def emit(text):
+        if precision is not None:
+            text = svgcompact.compact(text, precision)
+        fp.write(text)
+
+    with instrument.span("atlas.layers"):
+        layers = AtlasLayers(generate_astrolabe.render(year, precision))
+    with instrument.span("atlas.geometry"):
+        plate_set = astrolabe.plate_set([locations[name] for name in names])
+
+    if html:
+        head, tail = html_shell()
+        fp.write(head)
+    emit(
+        atlas_head.render(
+            width=columns * cell_size,
+            height=rows * cell_size,
+            defs=layers.defs,
+            front=layers.front,
+            RCapricorn=astrolabe.RadiusCapricorn,
+            REquator=astrolabe.RadiusEquator,
+            RCancer=astrolabe.RadiusCancer,
+        )
+    )
+    with instrument.span("atlas.plates"):
+        for n, name in enumerate(names):
+            plate = plate_set.plate(n, name)
+            row, column = divmod(n, columns)
+            emit(
+                atlas_plate.render(
+                    n=n,
+                    x=cell_size * column + cell_size / 2,
+                    y=cell_size * row + cell_size / 2,
+                    location=name,
+                    latitude=plate["latitude"],
+                    horiz=plate["horizon"],
+                    almucantar_coords=plate["almucantars"],
+                    azimuth_coords=plate["azimuths"],
+                    prime_vertical=plate["prime_vertical"],
+                    RCapricorn=astrolabe.RadiusCapricorn,
+                )
+            )
+    fp.write(atlas_tail)
+    if html:
+        fp.write(tail)
+    return len(names)
+
+
+@click.command()
+@click.option("--output", default="output/atlas.svg", help="Output file.")
+@click.option("--format", "fmt", default="svg", type=click.Choice(["svg", "html"]))
+@click.option(
+    "--latitude",
+    "latitudes",
+    multiple=True,
+    type=float,
+    help="Plate latitude; may be repeated. Defaults to the climata.",
+)
+@click.option("--columns", default=None, type=int, help="Plates per row.")
+@click.option("--year", default=2020, help="Year of the sun and moon markers.")
+@click.option(
+    "--precision",
+    default=None,
+    type=int,
+    help="Round coordinates to this many decimal places (compact SVG).",
+)
+def main(output, fmt, latitudes, columns, year, precision):
+    locations = None
+    if latitudes:
+        locations = {"{:.2f}".format(latitude): latitude for latitude in latitudes}
+    with open(output, "w") as fp:
+        count = write_atlas(
+            fp,
+            locations=locations,
+            year=year,
+            precision=precision,
+            columns=columns,
+            html=fmt == "html",
+        )
+    click.echo("{} plates written to {}".format(count, output))
+
+
+if __name__ == "__main__":
+    main()
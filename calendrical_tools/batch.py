@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Vectorized calendar conversions for arrays of fixed (rata die) dates.
+
+Each conversion takes a NumPy array of fixed day numbers and returns year,
+month and day column arrays, using the same integer arithmetic as the scalar
+pycalcal function of the same name (Reingold & Dershowitz, Calendrical
+Calculations). Use these instead of calling pycalcal one day at a time when
+filling in a whole candybar. convert_range streams a long span of days
+through them in chunks.
+"""
+
+import numpy as np
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import astronomy
+
+# Hebrew months in the order they occur in a year, starting at the new year
+# (Tishri). Adar II (13) only has days in leap years.
+hebrew_civil_months = np.array([7, 8, 9, 10, 11, 12, 13, 1, 2, 3, 4, 5, 6])
+
+
+def _as_days(dates):
+    return np.asarray(dates, dtype=np.int64)
+
+
+def is_gregorian_leap_year(year):
+    return (year % 4 == 0) & ~np.isin(year % 400, [100, 200, 300])
+
+
+def fixed_from_gregorian(year, month, day):
+    year, month, day = _as_days(year), _as_days(month), _as_days(day)
+    correction = np.where(
+        month <= 2, 0, np.where(is_gregorian_leap_year(year), -1, -2)
+    )
+    return (
+        pcc.GREGORIAN_EPOCH
+        - 1
+        + 365 * (year - 1)
+        + (year - 1) // 4
+        - (year - 1) // 100
+        + (year - 1) // 400
+        + (367 * month - 362) // 12
+        + correction
+        + day
+    )
+
+
+def gregorian_year_from_fixed(dates):
+    d0 = _as_days(dates) - pcc.GREGORIAN_EPOCH
+    n400, d1 = np.divmod(d0, 146097)
+    n100, d2 = np.divmod(d1, 36524)
+    n4, d3 = np.divmod(d2, 1461)
+    n1 = d3 // 365
+    year = 400 * n400 + 100 * n100 + 4 * n4 + n1
+    return np.where((n100 == 4) | (n1 == 4), year, year + 1)
+
+
+def gregorian_from_fixed(dates):
+    dates = _as_days(dates)
+    year = gregorian_year_from_fixed(dates)
+    prior_days = dates - fixed_from_gregorian(year, 1, 1)
+    correction = np.where(
+        dates < fixed_from_gregorian(year, 3, 1),
+        0,
+        np.where(is_gregorian_leap_year(year), 1, 2),
+    )
+    month = (12 * (prior_days + correction) + 373) // 367
+    day = 1 + dates - fixed_from_gregorian(year, month, 1)
+    return year, month, day
+
+
+def fixed_from_iso(year, week, day):
+    """ISO weeks start on Monday; week 1 holds the first Thursday."""
+    dec28 = fixed_from_gregorian(_as_days(year) - 1, 12, 28)
+    # nth_kday(week, SUNDAY, dec28) for positive week numbers.
+    sunday_before = (dec28 - 1) - (dec28 - 1) % 7
+    return 7 * _as_days(week) + sunday_before + _as_days(day)
+
+
+def iso_from_fixed(dates):
+    dates = _as_days(dates)
+    approx = gregorian_year_from_fixed(dates - 3)
+    year = np.where(dates >= fixed_from_iso(approx + 1, 1, 1), approx + 1, approx)
+    week = 1 + (dates - fixed_from_iso(year, 1, 1)) // 7
+    day = (dates - 1) % 7 + 1
+    return year, week, day
+
+
+def fixed_from_islamic(year, month, day):
+    year, month, day = _as_days(year), _as_days(month), _as_days(day)
+    return (
+        day
+        + 29 * (month - 1)
+        + (6 * month - 1) // 11
+        + (year - 1) * 354
+        + (3 + 11 * year) // 30
+        + pcc.ISLAMIC_EPOCH
+        - 1
+    )
+
+
+def islamic_from_fixed(dates):
+    dates = _as_days(dates)
+    year = (30 * (dates - pcc.ISLAMIC_EPOCH) + 10646) // 10631
+    prior_days = dates - fixed_from_islamic(year, 1, 1)
+    month = (11 * prior_days + 330) // 325
+    day = dates - fixed_from_islamic(year, month, 1) + 1
+    return year, month, day
+
+
+def hebrew_calendar_elapsed_days(year):
+    months_elapsed = (235 * _as_days(year) - 234) // 19
+    parts_elapsed = 12084 + 13753 * months_elapsed
+    days = 29 * months_elapsed + parts_elapsed // 25920
+    return np.where((3 * (days + 1)) % 7 < 3, days + 1, days)
+
+
+def hebrew_new_year(year):
+    year = _as_days(year)
+    ny0 = hebrew_calendar_elapsed_days(year - 1)
+    ny1 = hebrew_calendar_elapsed_days(year)
+    ny2 = hebrew_calendar_elapsed_days(year + 1)
+    correction = np.where(ny2 - ny1 == 356, 2, np.where(ny1 - ny0 == 382, 1, 0))
+    return pcc.HEBREW_EPOCH + ny1 + correction
+
+
+def is_hebrew_leap_year(year):
+    return (7 * _as_days(year) + 1) % 19 < 7
+
+
+def hebrew_month_starts(year):
+    """
+    Offsets from the new year of the first day of each month, one row per
+    year with columns in the order of hebrew_civil_months. Adar II has zero
+    length in common years, so its offset equals that of Nisan.
+    Returns (new_year, offsets, year_length).
+    """
+    year = np.atleast_1d(_as_days(year))
+    new_year = hebrew_new_year(year)
+    year_length = hebrew_new_year(year + 1) - new_year
+    leap = is_hebrew_leap_year(year)
+
+    lengths = np.empty((len(year), 13), dtype=np.int64)
+    lengths[:] = [30, 29, 30, 29, 30, 29, 29, 30, 29, 30, 29, 30, 29]
+    lengths[:, 1] = np.where(np.isin(year_length, [355, 385]), 30, 29)
+    lengths[:, 2] = np.where(np.isin(year_length, [353, 383]), 29, 30)
+    lengths[:, 5] = np.where(leap, 30, 29)
+    lengths[:, 6] = np.where(leap, 29, 0)
+
+    offsets = np.zeros_like(lengths)
+    offsets[:, 1:] = np.cumsum(lengths[:, :-1], axis=1)
+    return new_year, offsets, year_length
+
+
+def hebrew_from_fixed(dates):
+    dates = _as_days(dates)
+    approx = (
+        np.floor((dates - pcc.HEBREW_EPOCH) / (35975351 / 98496)).astype(np.int64) + 1
+    )
+    # Largest year on or after approx - 1 whose new year is not after date.
+    year = approx - 1
+    later = hebrew_new_year(year + 1) <= dates
+    while later.any():
+        year = np.where(later, year + 1, year)
+        later = hebrew_new_year(year + 1) <= dates
+
+    # Month structure is computed once per distinct year, not once per day.
+    years, index = np.unique(year, return_inverse=True)
+    new_year, offsets, _ = hebrew_month_starts(years)
+    offset = dates - new_year[index]
+    column = (offset[:, None] >= offsets[index]).sum(axis=1) - 1
+    month = hebrew_civil_months[column]
+    day = offset - offsets[index, column] + 1
+    return year, month, day
+
+
+def chinese_months(start, end):
+    """
+    First day, month number and leap flag of every Chinese month from the one
+    containing fixed date start through the one containing end.
+
+    Follows pcc.chinese_from_fixed, but works a sui (winter solstice to
+    winter solstice) at a time: the solstices, month 12 and the leap month
+    are found once per sui instead of once per day, and through the shared
+    astronomy memo, so adjacent ranges reuse each other's sui.
+    """
+    s1 = astronomy.chinese_winter_solstice_on_or_before(start)
+    m = astronomy.chinese_new_moon_before(1 + s1)
+    starts, months, leaps = [m], [11], [False]
+    while m <= end:
+        s2 = astronomy.chinese_winter_solstice_on_or_before(s1 + 370)
+        m12 = astronomy.chinese_new_moon_on_or_after(1 + s1)
+        next_m11 = astronomy.chinese_new_moon_before(1 + s2)
+        leap_year = pcc.iround((next_m11 - m12) / pcc.MEAN_SYNODIC_MONTH) == 12
+
+        # The first month of a leap sui without a major solar term is the
+        # leap month; every month from it on is numbered one lower.
+        prior_leap = False
+        m = m12
+        while m < next_m11:
+            leap = False
+            if leap_year and not prior_leap:
+                leap = prior_leap = astronomy.is_chinese_no_major_solar_term(m)
+            month = pcc.amod(
+                pcc.iround((m - m12) / pcc.MEAN_SYNODIC_MONTH) - prior_leap, 12
+            )
+            starts.append(m)
+            months.append(month)
+            leaps.append(leap)
+            m = astronomy.chinese_new_moon_on_or_after(m + 1)
+
+        starts.append(next_m11)
+        months.append(11)
+        leaps.append(False)
+        m = next_m11
+        s1 = s2
+    return np.array(starts), np.array(months), np.array(leaps)
+
+
+def chinese_from_fixed(dates):
+    """
+    Returns (cycle, year, month, leap, day) columns, identical to
+    pcc.chinese_from_fixed. Each day is an offset from the start of its
+    month, so the astronomy is done once per month, not once per day.
+    """
+    dates = _as_days(dates)
+    starts, months, leaps = chinese_months(int(dates.min()), int(dates.max()))
+    i = np.searchsorted(starts, dates, side="right") - 1
+    month = months[i]
+    elapsed_years = np.floor(
+        1.5 - (month / 12) + ((dates - pcc.CHINESE_EPOCH) / pcc.MEAN_TROPICAL_YEAR)
+    ).astype(np.int64)
+    cycle = 1 + (elapsed_years - 1) // 60
+    year = (elapsed_years - 1) % 60 + 1
+    day = 1 + dates - starts[i]
+    return cycle, year, month, leaps[i], day
+
+
+from_fixed_functions = {
+    "gregorian": gregorian_from_fixed,
+    "iso": iso_from_fixed,
+    "hebrew": hebrew_from_fixed,
+    "islamic": islamic_from_fixed,
+    "chinese": chinese_from_fixed,
+}
+
+
+def calendars_from_fixed(dates, calendars=None):
+    """
+    Convert an array of fixed dates into every calendar in one pass.
+    Returns a dict mapping calendar name to (year, month, day) arrays; for
+    "iso" the columns are (year, week, day) and for "chinese" they are
+    (cycle, year, month, leap, day). The Chinese calendar needs astronomy
+    and is only included when asked for.
+    """
+    if calendars is None:
+        calendars = ["gregorian", "iso", "hebrew", "islamic"]
+    dates = _as_days(dates)
+    return {cal: from_fixed_functions[cal](dates) for cal in calendars}
+
+
+# Names of the columns each conversion returns.
+column_names = {
+    "gregorian": ("year", "month", "day"),
+    "iso": ("year", "week", "day"),
+    "hebrew": ("year", "month", "day"),
+    "islamic": ("year", "month", "day"),
+    "chinese": ("cycle", "year", "month", "leap", "day"),
+}
+
+
+def convert_range(start, end, calendars=None, chunk=65536):
+    """
+    Convert the fixed dates start through end - 1, chunk days at a time.
+    Yields a dict per chunk with the chunk's "fixed" dates and, for each
+    calendar, its columns as calendars_from_fixed returns them, all aligned.
+
+    Only one chunk is held at a time, and the Chinese calendar's astronomy
+    goes through the size-bounded astronomy memo, so memory does not grow
+    with the length of the range.
+    """
+    for first in range(int(start), int(end), chunk):
+        fixed = np.arange(first, min(first + chunk, int(end)), dtype=np.int64)
+        columns = calendars_from_fixed(fixed, calendars)
+        columns["fixed"] = fixed
+        yield columns
+
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""On-disk cache for computed candybar data.
+
+Entries are JSON files in one directory, named by kind (e.g. "chinese" or
+"new_moons") and a hash of the parameters that produced them plus a hash of
+the code that computes them, so that a change to pycalcal or to this package
+never serves stale data. Files are written to a temporary name and moved into
+place with os.replace, so concurrent readers see either the old entry or the
+complete new one. When the directory grows past max_bytes the least recently
+used entries are removed. FileStore does the file handling, and is shared
+with the plate geometry cache.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import instrument
+
+package_dir = Path(__file__).parent
+
+
+def source_hash(*paths):
+    """Short hash of the contents of the given source files."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()[:12]
+
+
+def library_version():
+    """Hash of pycalcal and the modules that compute cached candybar data."""
+    return source_hash(
+        pcc.__file__,
+        package_dir / "batch.py",
+        package_dir / "candybar.py",
+        package_dir / "lunations.py",
+    )
+
+
+class FileStore:
+    """
+    Entries as files with a common suffix in one directory. Files are written
+    to a temporary name and moved into place with os.replace, reading one
+    marks it as recently used, and evict() removes the least recently used
+    files once the directory grows past max_bytes. Any number of processes
+    can share a store.
+    """
+
+    def __init__(self, directory, suffix, max_bytes, binary=False):
+        self.directory = Path(directory)
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.binary = binary
+
+    def path(self, name):
+        return self.directory / (name + self.suffix)
+
+    def read(self, name, load):
+        """load(fp) of the entry's open file, or None if there is no entry."""
+        path = self.path(name)
+        try:
+            with open(path, "rb" if self.binary else "r") as fp:
+                value = load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            # Mark as recently used for eviction.
+            os.utime(path)
+        except OSError:
+            # Another process evicted it after the read.
+            pass
+        return value
+
+    def write(self, name, dump):
+        """Write the entry with dump(fp), replacing any old one atomically."""
+        path = self.path(name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=path.stem, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb" if self.binary else "w") as fp:
+                dump(fp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def evict(self):
+        """
+        Remove least recently used entries until under max_bytes. Returns
+        the number removed.
+        """
+        entries = []
+        for path in self.directory.glob("*" + self.suffix):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                # Another process got there first.
+                pass
+            total -= size
+        return removed
+
+
+class WeekCache:
+    def __init__(self, directory="output/cache", max_bytes=64 * 2 ** 20, version=None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.store = FileStore(self.directory, ".json", max_bytes)
+        self.version = library_version() if version is None else version
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def name(self, kind, **params):
+        key = json.dumps([self.version, kind, sorted(params.items())])
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return "_".join([kind] + [str(params.get("year", ""))] + [digest])
+
+    def path(self, kind, **params):
+        return self.store.path(self.name(kind, **params))
+
+    def get(self, kind, **params):
+        """Return the cached value, or None on a miss."""
+        value = self.store.read(self.name(kind, **params), json.load)
+        if value is None:
+            self.stats["misses"] += 1
+            instrument.count("cache.misses")
+            return None
+        self.stats["hits"] += 1
+        instrument.count("cache.hits")
+        return value
+
+    def put(self, kind, value, **params):
+        self.store.write(self.name(kind, **params), lambda fp: json.dump(value, fp))
+        self.stats["writes"] += 1
+        instrument.count("cache.writes")
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until under max_bytes."""
+        removed = self.store.evict()
+        if removed:
+            self.stats["evictions"] += removed
+            instrument.count("cache.evictions", removed)
+
+    def report(self):
+        return (
+            "cache {}: {hits} hits, {misses} misses, {writes} writes, "
+            "{evictions} evictions"
+        ).format(self.directory, **self.stats)
+
+
+default_cache = None
+
+
+def get_default_cache():
+    global default_cache
+    if default_cache is None:
+        default_cache = WeekCache()
+    return default_cache
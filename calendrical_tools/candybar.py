@@ -2,15 +2,22 @@
 # coding: utf-8
 
 import datetime
-import json
-from pathlib import Path
 from collections import namedtuple
+from collections.abc import Mapping
 
 from jinja2 import Template
-from tqdm import tqdm
 import click
+import numpy as np
 
 from pycalcal import pycalcal as pcc
+from calendrical_tools import almanac as almanacmod
+from calendrical_tools import astronomy
+from calendrical_tools import batch
+from calendrical_tools import cache as cachemod
+from calendrical_tools import cursor as cursormod
+from calendrical_tools import instrument
+from calendrical_tools import lunations
+from calendrical_tools import weektable
 
 from_fixed_functions = {
     "gregorian": pcc.gregorian_from_fixed,
@@ -20,6 +27,19 @@ from_fixed_functions = {
 }
 
 
+class new_moon_tuple(
+    namedtuple(
+        "new_moon_tuple", "moon_since_1_1, moon_gregorian_date, moon_fixed_day"
+    )
+):
+    __slots__ = ()
+
+    @property
+    def moon_sidereal_longitude(self):
+        """Computed on first use; most callers only need the moment."""
+        return lunations.get_default_table().sidereal_longitude(self.moon_since_1_1)
+
+
 def chinese_day(d):
     return pcc.chinese_day(from_fixed_functions["chinese"](d))
 
@@ -28,38 +48,152 @@ def standard_day(d, calendar_type="gregorian"):
     return pcc.standard_day(from_fixed_functions[calendar_type](d))
 
 
+class LazyWeeks(Mapping):
+    """
+    Mapping of calendar name to weeks that computes each calendar the first
+    time it is looked up.
+    """
+
+    def __init__(self, compute, calendars):
+        self._compute = compute
+        self._calendars = list(calendars)
+        self._weeks = {}
+
+    def __getitem__(self, calendar_type):
+        if calendar_type not in self._calendars:
+            raise KeyError(calendar_type)
+        if calendar_type not in self._weeks:
+            self._weeks[calendar_type] = self._compute(calendar_type)
+        return self._weeks[calendar_type]
+
+    def __iter__(self):
+        return iter(self._calendars)
+
+    def __len__(self):
+        return len(self._calendars)
+
+
 class CandyBar:
     firstweekday = 0
-
-    def __init__(self, year=2020, weeks_before=1, weeks_after=0):
+    calendar_types = ["gregorian", "islamic", "hebrew", "chinese"]
+
+    def __init__(
+        self,
+        year=2020,
+        weeks_before=1,
+        weeks_after=0,
+        cache=None,
+        calendars=None,
+        almanac=None,
+    ):
+        """
+        Nothing is computed until it is used: weeks[calendar_type], iso and
+        new_moons are filled in on first access. calendars limits which of
+        calendar_types are available in weeks. Pass cache=False to always
+        recompute, or a WeekCache to use instead of the shared one in
+        output/cache. almanac, an almanac file path or Almanac, makes weeks
+        and new_moons read from it instead of being computed (windows outside
+        the file are computed as usual); it replaces the week cache unless
+        cache is given.
+        """
         self.year = year
         self._wks_before = weeks_before
         self._wks_after = weeks_after
-
-        wks, iso = self.isoweeks(
-            year, weeks_before=self._wks_before, weeks_after=self._wks_after
-        )
-        self._wks = wks
-        self.iso = iso
-        self.new_moons = self.new_moons_in_year(year)
-        self.weeks = {}
-
-        self.cache_file = "output/chinese_lunar_" + str(year)
-        self.CACHE_FILE_EXISTS = False
-
-        for calendar_type in ["gregorian", "islamic", "hebrew", "chinese"]:
-            if (calendar_type == "chinese") and Path(self.cache_file).exists():
-                self.CACHE_FILE_EXISTS = True
-                with open(self.cache_file) as fp:
-                    self.weeks["chinese"] = json.load(fp)
-            else:
-                self.weeks[calendar_type] = self.weeks_data(
-                    wks=self._wks, new_moons=self.new_moons, calendar_type=calendar_type
+        if isinstance(almanac, str):
+            almanac = almanacmod.get_almanac(almanac)
+        self.almanac = almanac
+        if cache is None:
+            cache = False if almanac is not None else cachemod.get_default_cache()
+        self.cache = cache
+        self.calendars = list(self.calendar_types if calendars is None else calendars)
+        for calendar_type in self.calendars:
+            if calendar_type not in self.calendar_types:
+                raise ValueError("unknown calendar type %s" % calendar_type)
+
+        self._window = None
+        self._iso = None
+        self._new_moons = None
+        self._table = None
+        self.weeks = LazyWeeks(self.calendar_weeks, self.calendars)
+
+    @property
+    def iso(self):
+        if self._iso is None:
+            with instrument.span("candybar.iso_weeks"):
+                self._iso = self.cached("iso", lambda: self.window()[1])
+        return self._iso
+
+    @property
+    def new_moons(self):
+        if self._new_moons is None:
+            with instrument.span("candybar.new_moons"):
+                self._new_moons = self.cached(
+                    "new_moons",
+                    lambda: self.new_moons_in_year(self.year),
+                    encode=lambda new_moons: list(new_moons.values()),
+                    decode=lambda value: {
+                        int(nm[2]): new_moon_tuple(*nm) for nm in value
+                    },
+                )
+        return self._new_moons
+
+    def day_table(self):
+        """The DayTable of the days in this candybar, shared by every calendar."""
+        if self._table is None:
+            start, end = self.window_range(self.year)
+            self._table = weektable.DayTable(np.arange(start, end), self.new_moons)
+        return self._table
+
+    def calendar_weeks(self, calendar_type):
+        table = self.day_table()
+        if calendar_type not in table.columns:
+            with instrument.span("candybar.convert." + calendar_type):
+                table.add(
+                    calendar_type,
+                    self.cached(
+                        calendar_type,
+                        lambda: self.convert(calendar_type),
+                        encode=lambda columns: [c.tolist() for c in columns],
+                    ),
                 )
+        return table.weeks(calendar_type)
+
+    def convert(self, calendar_type):
+        """calendar_type's columns for the days of the window, in one chunk."""
+        start, end = self.window_range(self.year)
+        almanac = self.almanac
+        if almanac is not None and almanac.covers(start, end, calendar_type):
+            return almanac.columns(calendar_type, start, end)
+        chunks = batch.convert_range(start, end, [calendar_type], chunk=end - start)
+        return next(chunks)[calendar_type]
+
+    def window(self):
+        """The isoweeks (weeks, iso list) pair for this candybar, computed once."""
+        if self._window is None:
+            self._window = self.isoweeks(
+                self.year, weeks_before=self._wks_before, weeks_after=self._wks_after
+            )
+        return self._window
 
-            if (calendar_type == "chinese") and (self.CACHE_FILE_EXISTS is False):
-                with open(self.cache_file, "w") as fp:
-                    json.dump(self.weeks["chinese"], fp)
+    def cached(self, kind, compute, encode=None, decode=None):
+        """
+        Look up kind in the week cache for this year and window, computing
+        and storing it on a miss.
+        """
+        if not self.cache:
+            return compute()
+        params = {
+            "year": self.year,
+            "weeks_before": self._wks_before,
+            "weeks_after": self._wks_after,
+            "firstweekday": self.firstweekday,
+        }
+        value = self.cache.get(kind, **params)
+        if value is not None:
+            return decode(value) if decode else value
+        value = compute()
+        self.cache.put(kind, encode(value) if encode else value, **params)
+        return value
 
     #     def itersolar(self, start, end):
     #          # Assumption: cal=calendar.CandyBar(6) <-- 1st day of week is Sunday.
@@ -100,11 +234,15 @@ class CandyBar:
         ## day count of days elapsed since 1/1/1 (rata die -- fixed day).
         first_thursday = pcc.nth_kday(1, 4, [year, 1, 1])
         ## Back up and enumerate days starting the week before.
-        days = [
-            first_thursday - 3 - (7 * weeks_before) + j
-            for j in range(0, (53 + weeks_before + weeks_after) * 7)
+        start = first_thursday - 3 - (7 * weeks_before)
+        days = np.arange(start, start + (53 + weeks_before + weeks_after) * 7)
+        years, months, mdays = batch.gregorian_from_fixed(days)
+        days_dates = [
+            (d, [y, m, md])
+            for d, y, m, md in zip(
+                days.tolist(), years.tolist(), months.tolist(), mdays.tolist()
+            )
         ]
-        days_dates = [(d, pcc.gregorian_from_fixed(d)) for d in days]
         ## List of weeks, starting on Mondays
         weeks = [days_dates[i : i + 7] for i in range(0, len(days_dates), 7)]
 
@@ -162,47 +300,37 @@ class CandyBar:
         corresponding to the gregorian year and will always iterate
         through complete weeks, so it will yield dates outside the specified year.
         """
-        date = datetime.date(year, 1, 1)
-        # Go back to the beginning of the week
-        days = (date.weekday() - self.firstweekday) % 7
-        date -= datetime.timedelta(days=days)
-        oneday = datetime.timedelta(days=1)
-        while True:
-            yield pcc.hebrew_from_fixed(
-                pcc.fixed_from_gregorian([date.year, date.month, date.day])
-            )
-            date += oneday
-            if date.year != year and date.weekday() == self.firstweekday:
-                break
+        dates = self.iteryeardates(year)
+        date = next(dates)
+        day = cursormod.HebrewCursor(
+            pcc.fixed_from_gregorian([date.year, date.month, date.day])
+        )
+        yield day.date()
+        for date in dates:
+            yield day.step().date()
 
-    def iteryeardays2_Hebrew(self, year, cal_type):
+    def iteryeardays2_Hebrew(self, year, cal_type="hebrew"):
         """
-        Like iteryeardates(), but will yield (day number, weekday number)
-        tuples. For days outside the specified month the day number is 0.
+        Like iteryeardates(), but will yield [(day number, weekday number),
+        (year, month)] pairs in cal_type (hebrew, islamic or chinese). For
+        days outside the specified gregorian year the day number is 0.
         """
-        for date in self.iteryeardates(year):
+        dates = list(self.iteryeardates(year))
+        first = pcc.fixed_from_gregorian([dates[0].year, dates[0].month, dates[0].day])
+        if cal_type in cursormod.cursors:
+            years, months, days = cursormod.cursor(cal_type, first).columns(len(dates))
+        elif cal_type == "chinese":
+            _, years, months, _, days = batch.chinese_from_fixed(
+                np.arange(first, first + len(dates))
+            )
+        else:
+            raise ValueError(f"calendar type {cal_type!r} not supported")
+        for date, year_value, month_value, day_value in zip(
+            dates, years.tolist(), months.tolist(), days.tolist()
+        ):
             if date.year != year:
-                fd = pcc.fixed_from_gregorian([date.year, date.month, date.day])
-                d = pcc.hebrew_from_fixed(fd)
-                day_value = pcc.standard_day(d)
-                month_value = pcc.standard_month(d)
-                year_value = pcc.standard_year(d)
-                yield [(0, date.weekday()), (year_value, month_value)]
-            else:
-                fd = pcc.fixed_from_gregorian([date.year, date.month, date.day])
-                if cal_type == "hebrew":
-                    d = pcc.hebrew_from_fixed(fd)
-                    day_value = pcc.standard_day(d)
-                    month_value = pcc.standard_month(d)
-                    year_value = pcc.standard_year(d)
-                elif cal_type == "chinese":
-                    d = pcc.chinese_from_fixed(fd)
-                    day_value = pcc.chinese_day(d)
-                    month_value = pcc.chinese_month(d)
-                else:
-                    print("type %s not implemented" % cal_type)
-                    return
-                    yield [(day_value, date.weekday()), (year_value, month_value)]
+                day_value = 0
+            yield [(day_value, date.weekday()), (year_value, month_value)]
 
     def iteryeardays3(self, year):
         """
@@ -216,10 +344,9 @@ class CandyBar:
             else:
                 yield (date.day, date.weekday())
 
-    # Brute force way to get a list of new moons occuring during the year. First
-    # approximate the number of new moons since the year 0 (using simple
-    # observation that length of month alternates between 29 and 30 days). Use
-    # astronomical approximation to get precise dates of new moons in the year.
+    # Brute force way to approximate the number of new moons since the year 0
+    # (using simple observation that length of month alternates between 29
+    # and 30 days). new_moons_in_year now looks moons up in a NewMoonTable.
 
     def many_moons(self, fixed_date, epoch=0):
         # Use part of formula for islamic_from_fixed:
@@ -231,52 +358,49 @@ class CandyBar:
         no_moons = year * 12
         return no_moons
 
-    def new_moons_in_year(self, year):
+    def window_range(self, year):
+        """First fixed day of the candybar window for year and the day after it."""
+        first_thursday = pcc.nth_kday(1, 4, [year, 1, 1])
+        start = first_thursday - 3 - (7 * self._wks_before)
+        return start, start + (53 + self._wks_before + self._wks_after) * 7
 
-        new_moon_tuple = namedtuple(
-            "new_moon_tuple",
-            "moon_since_1_1, moon_gregorian_date, moon_fixed_day, moon_sidereal_longitude",
-        )
-        fixed_date = pcc.fixed_from_gregorian([year, 1, 1])
-        fudge_factor = 3
-        no_moons = self.many_moons(fixed_date)
-        moon_rng = range(
-            no_moons - 12 - (4 * self._wks_before + fudge_factor),
-            no_moons + 13 + (4 * self._wks_after + fudge_factor),
-        )
-        new_moons_data = [(n, pcc.nth_new_moon(n)) for n in moon_rng]
-        new_moons = {}
-        for n, nnm in new_moons_data:
-            nm = pcc.gregorian_from_fixed(nnm)
-            key = int(nnm)
-            new_moons[key] = new_moon_tuple(
+    def new_moons_in_year(self, year):
+        """
+        New moons falling on the days of the candybar window for year, keyed
+        by fixed day.
+        """
+        start, end = self.window_range(year)
+        moons = self.almanac
+        if moons is None or not moons.covers(start, end):
+            moons = lunations.get_default_table(
+                pcc.gregorian_year_from_fixed(start),
+                pcc.gregorian_year_from_fixed(end - 1),
+            )
+        numbers, moments = moons.between(start, end)
+        new_moons_dict = {}
+        for n, nnm in zip(numbers.tolist(), moments.tolist()):
+            new_moons_dict[int(nnm)] = new_moon_tuple(
                 moon_since_1_1=n,
-                moon_gregorian_date=nm,
+                moon_gregorian_date=pcc.gregorian_from_fixed(nnm),
                 moon_fixed_day=nnm,
-                moon_sidereal_longitude=pcc.sidereal_lunar_longitude(nnm),
             )
-        return new_moons
+        return new_moons_dict
 
     def weeks_data(self, wks=None, new_moons=None, calendar_type="gregorian"):
-        weeks = []
-        for w in tqdm(wks):
-            iso_week_number = pcc.iso_week(pcc.iso_from_fixed(w[0][0]))
-            week_data = {}
-            week_data["iso"] = iso_week_number
-            week_data["raw"] = w
-            for d in w:
-                if d[0] in new_moons:
-                    new_moon = from_fixed_functions[calendar_type](d[0])
-                    week_data["new_moon"] = new_moon
-                    week_data["new_moon_fixed"] = d[0]
-            week = [week_data]
-            if calendar_type == "chinese":
-                week.append([chinese_day(d[0]) for d in w])
-            else:
-                week.append([standard_day(d[0], calendar_type) for d in w])
-            weeks.append(week)
-
-        return weeks
+        """
+        Weeks of wks as plain [details, day numbers] lists. CandyBar.weeks
+        holds views of a DayTable instead, which build these on demand.
+        """
+        fixed = [d[0] for w in wks for d in w]
+        table = weektable.DayTable(fixed, new_moons)
+        # Window days are consecutive, so arithmetic calendars are walked
+        # with a cursor instead of converting every day.
+        if calendar_type in cursormod.cursors and fixed == list(
+            range(fixed[0], fixed[0] + len(fixed))
+        ):
+            day = cursormod.cursor(calendar_type, fixed[0])
+            table.add(calendar_type, day.columns(len(fixed)))
+        return [list(week) for week in table.weeks(calendar_type)]
 
     def candybar(self, year):
         days = [d for d in self.iteryeardays3(year)]
@@ -396,7 +520,7 @@ class SvgCandyBar(CandyBar):
     }
 
     def __init__(self):
-        super().__init__()
+        super().__init__(calendars=["gregorian", "chinese"])
         self.bar_heading = self.year
 
     def bar_data(self, cal_type="gregorian"):
@@ -567,7 +691,9 @@ class LaTeXCandyBar(CandyBar):
                 if "molad" in week_details_dict:
                     n = week_days_list["raw"][6][0]
                     d = pcc.hebrew_from_fixed(n)
-                    i_molad = pcc.molad(pcc.standard_month(d), pcc.standard_year(d))
+                    i_molad = astronomy.molad(
+                        pcc.standard_month(d), pcc.standard_year(d)
+                    )
                     d_molad = pcc.hebrew_from_fixed(i_molad)
                     d_molad = "{}-{}-{}".format(
                         pcc.standard_year(d_molad),
@@ -661,7 +787,12 @@ class LaTeXCandyBar(CandyBar):
 @click.option("--weeks_after", default=0)
 @click.option("--year", default=2020, help="The calendar year.")
 def main(year, weeks_before, weeks_after):
-    cal = TextCandyBar(year, weeks_before=weeks_before, weeks_after=weeks_after)
+    cal = TextCandyBar(
+        year,
+        weeks_before=weeks_before,
+        weeks_after=weeks_after,
+        calendars=["gregorian"],
+    )
     cal.prcandybar()
 
 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Cursors that walk the days of an arithmetic calendar.
+
+A cursor stands on one fixed day and knows the calendar date there. The
+structure of the year it is in (the new year, where each month starts and
+the year's length) is worked out once, when the cursor enters the year, so
+moving by a day or a week is a few additions and comparisons rather than a
+full conversion from the fixed date. Cursors move backwards as well as
+forwards.
+
+    c = HebrewCursor(pcc.fixed_from_gregorian([2020, 1, 1]))
+    c.date()          # [5780, 10, 4]
+    c.step(7).date()  # a week later
+    c.step(-1)        # and back a day
+
+columns(count) fills the year, month and day columns of the next count days
+a month at a time, for DayTable.
+"""
+
+import numpy as np
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import batch
+
+
+class YearCursor:
+    """
+    Subclasses give year_of(fixed), the year containing a fixed date, and
+    structure(year), which returns (new_year, starts, months, length): the
+    fixed date of the year's first day, the offset of each month's first day
+    from it, the month numbers in the same order, and the length of the year.
+    """
+
+    def __init__(self, fixed):
+        self.fixed = int(fixed)
+        self._enter(self.year_of(self.fixed))
+        self._seek()
+
+    def _enter(self, year):
+        self.year = year
+        self.new_year, self.starts, self.months, self.length = self.structure(year)
+        self.column = 0
+
+    def _seek(self):
+        offset = self.fixed - self.new_year
+        while offset >= self.length:
+            self._enter(self.year + 1)
+            offset = self.fixed - self.new_year
+        while offset < 0:
+            self._enter(self.year - 1)
+            self.column = len(self.starts) - 1
+            offset = self.fixed - self.new_year
+        starts = self.starts
+        # Zero-length months share their start with the next month, so moving
+        # forwards skips over them and moving backwards steps past them.
+        while self.column + 1 < len(starts) and offset >= starts[self.column + 1]:
+            self.column += 1
+        while offset < starts[self.column]:
+            self.column -= 1
+        self.offset = offset
+
+    def step(self, days=1):
+        """Move days forwards (or backwards, if negative). Returns the cursor."""
+        self.fixed += days
+        self._seek()
+        return self
+
+    def date(self):
+        """[year, month, day], as the calendar's pycalcal from_fixed returns it."""
+        return [
+            self.year,
+            self.months[self.column],
+            self.offset - self.starts[self.column] + 1,
+        ]
+
+    def days(self, count, step=1):
+        """Yield the dates of count days, step days apart, starting here."""
+        for _ in range(count):
+            yield self.date()
+            self.step(step)
+
+    def columns(self, count):
+        """
+        Year, month and day arrays of the count days starting here, filled a
+        month at a time. Leaves the cursor on the day after them.
+        """
+        year = np.empty(count, dtype=np.int64)
+        month = np.empty(count, dtype=np.int64)
+        day = np.empty(count, dtype=np.int64)
+        i = 0
+        while i < count:
+            column = self.column
+            end = self.length
+            if column + 1 < len(self.starts):
+                end = self.starts[column + 1]
+            n = min(end - self.offset, count - i)
+            first = self.offset - self.starts[column] + 1
+            year[i : i + n] = self.year
+            month[i : i + n] = self.months[column]
+            day[i : i + n] = np.arange(first, first + n)
+            i += n
+            self.step(n)
+        return year, month, day
+
+
+class HebrewCursor(YearCursor):
+    """Hebrew dates, with years starting at Tishri as in pcc.hebrew_from_fixed."""
+
+    def year_of(self, fixed):
+        return int(batch.hebrew_from_fixed([fixed])[0][0])
+
+    def structure(self, year):
+        new_year, offsets, length = batch.hebrew_month_starts(year)
+        months = batch.hebrew_civil_months.tolist()
+        return int(new_year[0]), offsets[0].tolist(), months, int(length[0])
+
+
+class IslamicCursor(YearCursor):
+    """Arithmetic Islamic dates, as in pcc.islamic_from_fixed."""
+
+    def year_of(self, fixed):
+        return pcc.quotient(30 * (fixed - pcc.ISLAMIC_EPOCH) + 10646, 10631)
+
+    def structure(self, year):
+        firsts = batch.fixed_from_islamic(year, np.arange(1, 13), 1)
+        new_year = int(firsts[0])
+        length = int(batch.fixed_from_islamic(year + 1, 1, 1)) - new_year
+        return new_year, (firsts - new_year).tolist(), list(range(1, 13)), length
+
+
+cursors = {"hebrew": HebrewCursor, "islamic": IslamicCursor}
+
+
+def cursor(calendar_type, fixed):
+    """A cursor for calendar_type (hebrew or islamic) standing on fixed."""
+    return cursors[calendar_type](fixed)
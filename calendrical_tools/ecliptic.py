@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""The ecliptic scale of the rete.
+
+An EclipticScale converts between ecliptic longitude and points on the
+rete's ecliptic circle, for whole arrays at once. Longitude to position is
+the stereographic projection of the ecliptic. Position back to longitude
+goes through right ascension,
+
+    \\tan\\lambda = \\frac{\\tan\\alpha}{\\cos\\epsilon},
+
+so both directions are closed-form and cost the same at any resolution.
+Graduations at a given step are computed once per scale and kept.
+
+Points are in the rete's frame in the templates: the stars' frame (see
+stars.py) turned by 180 degrees, with the ecliptic circle centred at
+(0, yEclipticCenter). Ring angles are measured about that centre,
+counter-clockwise from +x.
+"""
+
+import numpy as np
+
+from calendrical_tools import astronomy
+
+
+class EclipticScale:
+    def __init__(self, obliquity=23.4443291, radius_capricorn=100):
+        self.obliquity = obliquity
+        self.radius_capricorn = radius_capricorn
+        argument = np.radians((90 - obliquity) / 2)
+        self.radius_equator = radius_capricorn * np.tan(argument)
+        radius_cancer = self.radius_equator * np.tan(argument)
+        self.radius = (radius_capricorn + radius_cancer) / 2.0
+        self.center_y = (radius_capricorn - radius_cancer) / 2.0
+        self._cos_obliquity = np.cos(np.radians(obliquity))
+        self._graduations = {}
+
+    def position(self, longitude):
+        """(x, y) arrays of the ecliptic points at longitudes (degrees)."""
+        lam = np.radians(np.asarray(longitude, dtype=float))
+        alpha = np.arctan2(np.sin(lam) * self._cos_obliquity, np.cos(lam))
+        sin_dec = np.sin(np.radians(self.obliquity)) * np.sin(lam)
+        r = self.radius_equator * np.sqrt((1 - sin_dec) / (1 + sin_dec))
+        return -r * np.cos(alpha), -r * np.sin(alpha)
+
+    def longitude(self, x, y):
+        """
+        Longitude (degrees, [0, 360)) of the ecliptic point at the same right
+        ascension as each rete point (x, y), as read off a rule laid through
+        the centre.
+        """
+        alpha = np.arctan2(-np.asarray(y, dtype=float), -np.asarray(x, dtype=float))
+        lam = np.arctan2(np.sin(alpha), np.cos(alpha) * self._cos_obliquity)
+        return np.degrees(lam) % 360
+
+    def ring_angle(self, longitude):
+        """Angles about the ecliptic circle's centre of longitudes."""
+        x, y = self.position(longitude)
+        return np.degrees(np.arctan2(y - self.center_y, x)) % 360
+
+    def longitude_at(self, theta):
+        """Longitudes at ring angles theta (degrees) about the circle's centre."""
+        t = np.radians(np.asarray(theta, dtype=float))
+        return self.longitude(
+            self.radius * np.cos(t), self.center_y + self.radius * np.sin(t)
+        )
+
+    def graduations(self, step=0.5):
+        """
+        Graduations every step degrees of longitude, as a dict of longitude,
+        x, y and theta (ring angle) arrays.
+        """
+        if step not in self._graduations:
+            longitude = np.arange(0, 360, step, dtype=float)
+            x, y = self.position(longitude)
+            self._graduations[step] = {
+                "longitude": longitude,
+                "x": x,
+                "y": y,
+                "theta": np.degrees(np.arctan2(y - self.center_y, x)) % 360,
+            }
+        return self._graduations[step]
+
+    def solar_positions(self, moments):
+        """Solar longitudes at moments (fixed dates), and their (x, y)."""
+        moments = np.asarray(moments, dtype=float).tolist()
+        longitude = np.array([astronomy.solar_longitude(t) for t in moments])
+        x, y = self.position(longitude)
+        return longitude, x, y
+
+
+scales = {}
+
+
+def get_scale(obliquity=23.4443291, radius_capricorn=100):
+    """The shared EclipticScale for (obliquity, radius_capricorn)."""
+    key = (round(float(obliquity), 9), round(float(radius_capricorn), 9))
+    if key not in scales:
+        scales[key] = EclipticScale(*key)
+    return scales[key]
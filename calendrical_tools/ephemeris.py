@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Sun and moon positions on the rete for arrays of dates.
+
+For each date, the sun's and moon's ecliptic longitude (and the moon's
+latitude) come from pycalcal through the shared astronomy memo. pycalcal's
+series are scalar, so each distinct moment is evaluated once and then
+remembered, in the memo and in its persistent store if one is configured.
+The conversion to right ascension and declination and the stereographic
+projection onto the plate are done for all dates at once in NumPy.
+
+Positions are in the frame the rete's stars use: distance r from the centre
+as a multiple of R_{Equator} and angle theta equal to the right ascension, so
+cx and cy can go straight into the stars group of the template.
+"""
+
+import numpy as np
+
+from calendrical_tools import astronomy
+from calendrical_tools import batch
+
+
+def ecliptic_to_plate(longitude, latitude, obliquity, radius_equator):
+    """
+    Project ecliptic longitude and latitude arrays (degrees) onto the plate.
+    Returns (ra, dec, r, cx, cy) arrays.
+
+        \\sin\\delta = \\sin\\beta\\cos\\epsilon + \\cos\\beta\\sin\\epsilon\\sin\\lambda
+        \\tan\\alpha = \\frac{\\sin\\lambda\\cos\\epsilon - \\tan\\beta\\sin\\epsilon}{\\cos\\lambda}
+    """
+    lam = np.radians(np.asarray(longitude, dtype=float))
+    beta = np.radians(np.asarray(latitude, dtype=float))
+    eps = np.radians(obliquity)
+
+    dec = np.arcsin(
+        np.sin(beta) * np.cos(eps) + np.cos(beta) * np.sin(eps) * np.sin(lam)
+    )
+    ra = np.arctan2(
+        np.sin(lam) * np.cos(eps) - np.tan(beta) * np.sin(eps), np.cos(lam)
+    )
+    r = np.tan((np.pi / 2 - dec) / 2)
+    cx = radius_equator * r * np.cos(ra)
+    cy = radius_equator * r * np.sin(ra)
+    return np.degrees(ra) % 360, np.degrees(dec), r, cx, cy
+
+
+def _moments(dates, hour):
+    return (np.asarray(dates, dtype=float) + hour / 24.0).tolist()
+
+
+def _records(dates, longitude, latitude, astrolabe):
+    ra, dec, r, cx, cy = ecliptic_to_plate(
+        longitude, latitude, astrolabe.obliquity, astrolabe.RadiusEquator
+    )
+    return [
+        {
+            "date": date,
+            "longitude": lon,
+            "latitude": lat,
+            "ra": a,
+            "dec": d,
+            "r": rr,
+            "theta": a,
+            "cx": x,
+            "cy": y,
+        }
+        for date, lon, lat, a, d, rr, x, y in zip(
+            np.asarray(dates).tolist(),
+            np.asarray(longitude, dtype=float).tolist(),
+            np.asarray(latitude, dtype=float).tolist(),
+            ra.tolist(),
+            dec.tolist(),
+            r.tolist(),
+            cx.tolist(),
+            cy.tolist(),
+        )
+    ]
+
+
+def sun_positions(dates, astrolabe, hour=12):
+    """The sun on astrolabe's rete at hour (UT) of each fixed date."""
+    longitude = [astronomy.solar_longitude(t) for t in _moments(dates, hour)]
+    return _records(dates, longitude, np.zeros(len(longitude)), astrolabe)
+
+
+def moon_positions(dates, astrolabe, hour=12):
+    """The moon on astrolabe's rete at hour (UT) of each fixed date."""
+    moments = _moments(dates, hour)
+    longitude = [astronomy.lunar_longitude(t) for t in moments]
+    latitude = [astronomy.lunar_latitude(t) for t in moments]
+    return _records(dates, longitude, latitude, astrolabe)
+
+
+def sun_moon_positions(dates, astrolabe, hour=12):
+    return {
+        "sun": sun_positions(dates, astrolabe, hour),
+        "moon": moon_positions(dates, astrolabe, hour),
+    }
+
+
+def month_starts(year):
+    """Fixed dates of the first of each month of a Gregorian year."""
+    return batch.fixed_from_gregorian(year, np.arange(1, 13), 1)
+
+
+def year_days(year):
+    """Fixed dates of every day of a Gregorian year."""
+    start = int(batch.fixed_from_gregorian(year, 1, 1))
+    return np.arange(start, int(batch.fixed_from_gregorian(year + 1, 1, 1)))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Export the per-day calendar table to CSV, NDJSON or Parquet.
+
+Each row is one fixed day: the day number, its ISO week, the year, month and
+day (or the calendar's own fields) of each calendar, whether a new moon falls
+on the day and, if one does, its moment. This is the table behind
+CandyBar.weeks, for any span of days.
+
+    python -m calendrical_tools.export --start 1900 --end 1999 --format csv --output days.csv
+    python -m calendrical_tools.export --candybar 2020 --format ndjson --output 2020.ndjson
+
+Days are converted with batch.convert_range a chunk at a time, and each chunk
+is formatted and handed to a writer thread, so conversion and disk writes
+overlap and only a couple of chunks are ever in memory. Parquet output needs
+pyarrow, which is imported only when asked for.
+"""
+
+import queue
+import threading
+
+import click
+import numpy as np
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import batch
+from calendrical_tools import lunations
+
+default_calendars = ["gregorian", "iso", "hebrew", "islamic"]
+
+
+def column_names(calendars):
+    # The iso calendar's own week column stands in for iso_week.
+    names = ["fixed"] if "iso" in calendars else ["fixed", "iso_week"]
+    for cal in calendars:
+        names.extend(cal + "_" + field for field in batch.column_names[cal])
+    return names + ["new_moon", "new_moon_moment"]
+
+
+def day_columns(start, end, calendars=None, chunk=65536):
+    """
+    Yield the day table for fixed dates start..end-1, a dict of named column
+    arrays per chunk, in column_names(calendars) order.
+    """
+    if calendars is None:
+        calendars = default_calendars
+    table = lunations.get_default_table(
+        pcc.gregorian_year_from_fixed(start), pcc.gregorian_year_from_fixed(end - 1)
+    )
+    converted = ["iso"] + [cal for cal in calendars if cal != "iso"]
+    for columns in batch.convert_range(start, end, converted, chunk):
+        fixed = columns["fixed"]
+        _, moments = table.between(int(fixed[0]), int(fixed[-1]) + 1)
+        moment = np.full(len(fixed), np.nan)
+        moment[np.floor(moments).astype(np.int64) - fixed[0]] = moments
+
+        day = {"fixed": fixed}
+        if "iso" not in calendars:
+            day["iso_week"] = columns["iso"][1]
+        for cal in calendars:
+            for field, values in zip(batch.column_names[cal], columns[cal]):
+                day[cal + "_" + field] = values
+        day["new_moon"] = ~np.isnan(moment)
+        day["new_moon_moment"] = moment
+        yield day
+
+
+def _text_columns(day, names):
+    """
+    Each column as a list ready for %s formatting: booleans as true/false,
+    NaN as null and integers as they are.
+    """
+    text = []
+    for name in names:
+        values = day[name]
+        if values.dtype == bool:
+            text.append(np.where(values, "true", "false").tolist())
+        elif values.dtype.kind == "f":
+            text.append(["null" if v != v else repr(v) for v in values.tolist()])
+        else:
+            text.append(values.tolist())
+    return text
+
+
+class CsvFormat:
+    # Every field is a number or true/false, so none needs quoting.
+
+    def __init__(self, names):
+        self.names = names
+        self.row = ",".join(["%s"] * len(names)) + "\n"
+
+    def header(self):
+        return ",".join(self.names) + "\n"
+
+    def format(self, day):
+        columns = _text_columns(day, self.names)
+        # Missing moments are left empty rather than written as null.
+        i = self.names.index("new_moon_moment")
+        columns[i] = ["" if v == "null" else v for v in columns[i]]
+        row = self.row
+        return "".join(row % values for values in zip(*columns))
+
+
+class NdjsonFormat:
+    def __init__(self, names):
+        self.names = names
+        self.row = "{" + ", ".join('"%s": %%s' % name for name in names) + "}\n"
+
+    def header(self):
+        return ""
+
+    def format(self, day):
+        row = self.row
+        return "".join(row % values for values in zip(*_text_columns(day, self.names)))
+
+
+class ParquetWriter:
+    """Writes each chunk as a Parquet row group."""
+
+    def __init__(self, path, names):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pyarrow = pyarrow
+        self.names = names
+        self.path = path
+        self.writer = None
+
+    def write(self, day):
+        table = self.pyarrow.table([day[name] for name in self.names], names=self.names)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+formats = {"csv": CsvFormat, "ndjson": NdjsonFormat}
+
+
+def _drain(fp, chunks, errors):
+    # After a failed write the rest of the queue is still taken, so the
+    # producer never blocks on a full queue; it stops when it sees the error.
+    while True:
+        text = chunks.get()
+        if text is None:
+            return
+        if errors:
+            continue
+        try:
+            fp.write(text)
+        except Exception as e:
+            errors.append(e)
+
+
+def export(path, start, end, fmt="csv", calendars=None, chunk=65536):
+    """
+    Write the day table for fixed dates start..end-1 to path in fmt (csv,
+    ndjson or parquet). Returns the number of rows written.
+    """
+    if calendars is None:
+        calendars = default_calendars
+    names = column_names(calendars)
+    days = day_columns(start, end, calendars, chunk)
+    rows = 0
+
+    if fmt == "parquet":
+        writer = ParquetWriter(path, names)
+        try:
+            for day in days:
+                writer.write(day)
+                rows += len(day["fixed"])
+        finally:
+            writer.close()
+        return rows
+
+    formatter = formats[fmt](names)
+    # Formatting runs here while the previous chunk is being written; the
+    # bounded queue keeps at most two formatted chunks waiting.
+    chunks = queue.Queue(maxsize=2)
+    errors = []
+    with open(path, "w", newline="") as fp:
+        writer = threading.Thread(target=_drain, args=(fp, chunks, errors))
+        writer.start()
+        try:
+            chunks.put(formatter.header())
+            for day in days:
+                if errors:
+                    break
+                chunks.put(formatter.format(day))
+                rows += len(day["fixed"])
+        finally:
+            chunks.put(None)
+            writer.join()
+        if errors:
+            raise errors[0]
+    return rows
+
+
+@click.command()
+@click.option("--start", default=None, type=int, help="First Gregorian year.")
+@click.option("--end", default=None, type=int, help="Last Gregorian year.")
+@click.option(
+    "--candybar",
+    default=None,
+    type=int,
+    help="Export exactly the days of this year's candybar window instead.",
+)
+@click.option(
+    "--calendar",
+    "calendars",
+    multiple=True,
+    type=click.Choice(list(batch.column_names)),
+    help="Calendar to include; may be repeated. Defaults to all but chinese.",
+)
+@click.option(
+    "--format", "fmt", default="csv", type=click.Choice(["csv", "ndjson", "parquet"])
+)
+@click.option("--chunk", default=65536, help="Days converted per chunk.")
+@click.option("--output", default="output/days.csv", help="Output file.")
+def main(start, end, candybar, calendars, fmt, chunk, output):
+    if candybar is not None:
+        from calendrical_tools import candybar as candybarmod
+
+        first, last = candybarmod.CandyBar(candybar, cache=False).window_range(
+            candybar
+        )
+    elif start is not None:
+        end = start if end is None else end
+        first = int(batch.fixed_from_gregorian(start, 1, 1))
+        last = int(batch.fixed_from_gregorian(end + 1, 1, 1))
+    else:
+        raise click.UsageError("give --start (and --end) or --candybar")
+    try:
+        rows = export(output, first, last, fmt, list(calendars) or None, chunk)
+    except RuntimeError as e:
+        raise click.UsageError(str(e))
+    click.echo("{} days written to {}".format(rows, output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Frame sequences of the rete turning over the plate.
+
+Only the rete moves between frames, and only the rotate() on its group
+changes. So the astrolabe is rendered once, and the SVG is split around that
+attribute. Each frame is the static text before it, the new angle, and the
+static text after it. Frames are written in chunks by a pool of worker
+processes, as SVG or (with cairosvg installed) PNG.
+
+    python -m calendrical_tools.frames --days 1 --frames 240 --jobs 4
+
+The rete turns once a sidereal day, 360.9856 degrees per solar day, so a
+one-day sequence shows it turning once, and frames a day apart over a year
+show the slow drift that brings the stars back to the same place.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+import numpy as np
+
+from calendrical_tools import generate_astrolabe
+
+SIDEREAL_DEGREES_PER_DAY = 360.98564736629
+
+rete_rotation = re.compile(r'(<g id = "rete"[^>]*transform="rotate\()([-\d.e]+)(\)">)')
+
+
+class FrameRenderer:
+    def __init__(self, svg):
+        match = rete_rotation.search(svg)
+        if match is None:
+            raise ValueError("no rotated rete group in the astrolabe SVG")
+        self.head = svg[: match.end(1)]
+        self.tail = svg[match.start(3) :]
+        self.base_angle = float(match.group(2))
+
+    def frame(self, angle):
+        """The SVG with the rete turned angle degrees from where it was drawn."""
+        return "{}{:.4f}{}".format(
+            self.head, (self.base_angle + angle) % 360, self.tail
+        )
+
+
+def rotation_angles(days, frames):
+    """Rete angles for frames evenly spaced over days (solar) of time."""
+    elapsed = np.arange(frames) * (days / frames)
+    return (SIDEREAL_DEGREES_PER_DAY * elapsed) % 360
+
+
+def frame_filename(directory, n, fmt):
+    return os.path.join(directory, "frame_{:05d}.{}".format(n, fmt))
+
+
+def _write_frames(args):
+    renderer, numbers, angles, directory, fmt = args
+    if fmt == "png":
+        import cairosvg
+    for n, angle in zip(numbers, angles):
+        svg = renderer.frame(angle)
+        outfile = frame_filename(directory, n, fmt)
+        if fmt == "png":
+            cairosvg.svg2png(bytestring=svg.encode(), write_to=outfile)
+        else:
+            with open(outfile, "w") as fp:
+                fp.write(svg)
+    return len(numbers)
+
+
+def render_frames(
+    renderer, angles, directory="output/frames", fmt="svg", jobs=1, chunk_size=25
+):
+    """Write a frame per angle into directory; returns the number written."""
+    if fmt not in ("svg", "png"):
+        raise ValueError("unknown frame format %s" % fmt)
+    os.makedirs(directory, exist_ok=True)
+    angles = list(angles)
+    chunks = [
+        (
+            renderer,
+            range(i, min(i + chunk_size, len(angles))),
+            angles[i : i + chunk_size],
+            directory,
+            fmt,
+        )
+        for i in range(0, len(angles), chunk_size)
+    ]
+    if jobs == 1:
+        return sum(map(_write_frames, chunks))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return sum(executor.map(_write_frames, chunks))
+
+
+@click.command()
+@click.option("--days", default=1.0, help="Span of time the frames cover, in days.")
+@click.option("--frames", default=240, help="Number of frames.")
+@click.option("--year", default=2020, help="Year of the sun and moon markers.")
+@click.option("--format", "fmt", default="svg", type=click.Choice(["svg", "png"]))
+@click.option(
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes.",
+)
+@click.option("--output", default="output/frames", help="Directory for the frames.")
+@click.option(
+    "--precision",
+    default=None,
+    type=int,
+    help="Round coordinates to this many decimal places (compact SVG).",
+)
+def main(days, frames, year, fmt, jobs, output, precision):
+    if fmt == "png":
+        try:
+            import cairosvg  # noqa: F401
+        except ImportError:
+            raise click.UsageError("PNG frames need cairosvg (pip install cairosvg)")
+
+    started = time.perf_counter()
+    renderer = FrameRenderer(generate_astrolabe.render(year, precision))
+    rendered = time.perf_counter()
+    count = render_frames(
+        renderer, rotation_angles(days, frames), directory=output, fmt=fmt, jobs=jobs
+    )
+    elapsed = time.perf_counter() - rendered
+    click.echo(
+        "static layers {:.3f}s; {} frames in {:.2f}s, {:.1f} frames/s".format(
+            rendered - started, count, elapsed, count / elapsed if elapsed else 0.0
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,39 @@
 # coding: utf-8
 
 import math
+import os
+
 from jinja2 import Template
+import numpy as np
 
-from svgpathtools import Path, Arc, Line, svg2paths
+from calendrical_tools import ecliptic as eclipticmod
+from calendrical_tools import ephemeris
+from calendrical_tools import instrument
+from calendrical_tools import plates as platesmod
+from calendrical_tools import stars as starsmod
+from calendrical_tools import svgcompact
 
 # from generate_astrolabe import *
 
+
+def arc_path(start, end, radius, large_arc=True, sweep=False):
+    """
+    SVG path data for a circular arc from start to end, (x, y) pairs, written
+    the way svgpathtools' Path.d() writes the same Arc.
+    """
+    return "M {},{} A {},{} {} {:d},{:d} {},{}".format(
+        float(start[0]),
+        float(start[1]),
+        float(radius),
+        float(radius),
+        0.0,
+        int(large_arc),
+        int(sweep),
+        float(end[0]),
+        float(end[1]),
+    )
+
+
 # Flat list of all of the parts of an astrolabe. Once computed, these will be used in
 # a jinja template to generate an svg diagram.
 identifiers = [
@@ -66,7 +93,7 @@ class Astrolabe:
         self._obliquityRadians = math.radians(obliquity)
         self._obliquityRadiansArgument = math.radians((90 - self.obliquity) / 2)
         self.RadiusCapricorn = radius_capricorn
-        self.plate_parameters = self.climata
+        self.plate_parameters = dict(self.climata)
         self.plate_altitudes = list(range(0, 90, 10))
         self.plate_azimuths = list(range(10, 90, 10))
 
@@ -92,9 +119,7 @@ class Astrolabe:
         self.yEclipticCenter = (self.RadiusCapricorn - self.RadiusCancer) / 2.0
         self.xEclipticCenter = 0.0
 
-        self.ecliptic_pole = self.RadiusEquator * math.tan(
-            self._obliquityRadiansArgument / 2.0
-        )
+        self.ecliptic_pole = self.RadiusEquator * math.tan(self._obliquityRadians / 2.0)
         self.ecliptic_center = self.RadiusEquator * math.tan(
             self._obliquityRadiansArgument
         )
@@ -106,58 +131,47 @@ class Astrolabe:
             "width": 5,
         }
 
-        self.ecliptic_path = Path(
-            Arc(
-                start=complex(0, self.ecliptic["cy"] + self.ecliptic["r"]),
-                radius=(complex(self.ecliptic["r"], self.ecliptic["r"])),
-                rotation=0.0,
-                large_arc=True,
-                sweep=False,
-                end=complex(0, self.ecliptic["cy"] - self.ecliptic["r"]),
-            ),
-            Arc(
-                start=complex(0, self.ecliptic["cy"] - self.ecliptic["r"]),
-                radius=(complex(self.ecliptic["r"], self.ecliptic["r"])),
-                rotation=0.0,
-                large_arc=True,
-                sweep=False,
-                end=complex(0, self.ecliptic["cy"] + self.ecliptic["r"]),
-            ),
-        )
+    def ecliptic_scale(self):
+        """The rete's ecliptic scale, see ecliptic.EclipticScale."""
+        return eclipticmod.get_scale(self.obliquity, self.RadiusCapricorn)
 
     def plates(self, plate_parameters=None):
         if plate_parameters is not None:
             self.plate_parameters.update(plate_parameters)
 
+        # All plates are computed in one vectorized pass. Note: if different
+        # locations with same name, will overwrite.
+        locations = list(self.plate_parameters)
+        plate_set = self.plate_set([self.plate_parameters[l] for l in locations])
         self.plates = {}
-        for location, latitude in self.plate_parameters.items():
-            if location not in self.plates:
-                self.plates[location] = {"location": location, "latitude": latitude}
-            # Note: if different locations with same name, will overwrite.
-            self.plate(location=location)
+        for i, location in enumerate(locations):
+            self.plates[location] = self._plate(plate_set, i, location)
 
-    def plate(self, location=None):
-        """Compute parts for one plate"""
-        plate = self.plates[location]
-        plate_latitude = plate["latitude"]
-
-        almucantars = self.almucantar_arcs(
-            altitudes=self.plate_altitudes, latitude=plate_latitude
+    def plate_set(self, latitudes):
+        """
+        Plate grid circles for many latitudes at once, as a plates.PlateSet,
+        from the shared plate geometry cache.
+        """
+        return platesmod.get_default_cache().plate_set(
+            latitudes,
+            altitudes=self.plate_altitudes,
+            azimuths=self.plate_azimuths,
+            obliquity=self.obliquity,
+            radius_capricorn=self.RadiusCapricorn,
         )
-        plate["almucantars"] = almucantars
 
-        almucantar_center = self.almucantar_arc(altitude=80, latitude=plate_latitude)
-        plate["almucantar_center"] = almucantar_center
-
-        plate["horizon"] = self.horizon(latitude=plate_latitude)
-
-        prime_vertical = self.azimuth_arc(
-            azimuth=90, latitude=plate_latitude, prime=True
+    def _plate(self, plate_set, i, location):
+        plate = plate_set.plate(i, location)
+        plate["latitude"] = self.plate_parameters[location]
+        plate["almucantar_center"] = self.almucantar_arc(
+            altitude=80, latitude=plate["latitude"]
         )
-        plate["prime_vertical"] = prime_vertical[0]  # TODO: clean this up
+        return plate
 
-        azimuth_arcs = self.azimuth_arcs(latitude=plate_latitude)
-        plate["azimuths"] = azimuth_arcs
+    def plate(self, location=None):
+        """Compute parts for one plate"""
+        latitude = self.plates[location]["latitude"]
+        self.plates[location] = self._plate(self.plate_set([latitude]), 0, location)
 
     def horizon(self, latitude=None):
         radiansLatitude = math.radians(latitude)
@@ -166,6 +180,13 @@ class Astrolabe:
         xHorizon = 0.0
         return {"cx": xHorizon, "cy": yHorizon, "r": rHorizon}
 
+    def plate_to_horizontal(self, x, y, latitude):
+        """
+        Altitude, azimuth, declination and hour angle at plate points (x, y),
+        see plates.plate_to_horizontal.
+        """
+        return platesmod.plate_to_horizontal(x, y, latitude, self.RadiusEquator)
+
     def tropic_arcs(self):
         r""" The size of an astrolabe is contolled by the radius of the
         tropic of Capricorn. Recall that the tropics represent the
@@ -263,77 +284,76 @@ class Astrolabe:
             azimuth_coords.extend(coords)
         return azimuth_coords
 
-    def ecliptic_division(self, constructionAngle=None):
+    def ecliptic_divisions(self, angles):
+        """
+        Points where the ecliptic is divided for each equator angle in angles,
+        as a list of {"angle", "x2", "y2"} dicts.
+
+        The procedure for dividing the ecliptic is (Figure 6-7 with the following steps numbered):
+        1. Locate the ecliptic pole on the meridian at $R_{eq} \tan(\epsilon / 2)$ from the center.
+        2. Divide the equator into equal segments of longitude: 12 divisions of 30 for the entry
+           into each zodiac sign: more divisions depending on the resolution desired.
+        3. Draw a line from each equator division to the ecliptic pole. The corresponding longitude
+           point on the ecliptic is where this line intersects the ecliptic circle.
+        4. A tic mark on the ecliptic is drawn toward the center of the instrument.
+
+        The point this construction finds for equator angle a is the ecliptic
+        at longitude a + 180, so it is taken in closed form from the ecliptic
+        scale.
+        """
+        angles = list(angles)
+        x2, y2 = self.ecliptic_scale().position(
+            (np.asarray(angles, dtype=float) + 180) % 360
+        )
+        return [
+            {"angle": angle, "x2": x, "y2": y}
+            for angle, x, y in zip(angles, x2.tolist(), y2.tolist())
+        ]
 
-        # The procedure for dividing the ecliptic is (Figure 6-7 with the following steps numbered):
-        # 1. Locate the ecliptic pole on the meridian at $R_{eq} \tan(\epsilon / 2)$ from the center.
-        # 2. Divide the equator into equal segments of longitude: 12 divisions of 30 for the entry
-        #    into each zodiac sign: more divisions depending on the resolution desired.
-        # 3. Draw a line from each equator division to the ecliptic pole. The corresponding longitude
-        #    point on the ecliptic is where this line intersects the ecliptic circle.
-        # 4. A tic mark on the ecliptic is drawn toward the center of the instrument.
-
-        # Endpoint of line on the Equator, through origin with slope give by angle.
-        x0 = self.RadiusEquator * math.cos(math.radians(constructionAngle))
-        y0 = self.RadiusEquator * math.sin(math.radians(constructionAngle))
-
-        # Endpoint of a line from the ecliptic pole to mark on equator makes
-        # an angle theta2.
-        theta2 = math.atan2((y0 - self.ecliptic_pole), x0)
-        if x0 > 0.0:
-            slope = (y0 - self.ecliptic_pole) / x0
-            # Draw line through equator division and ecliptic pole.
-            # Since the ecliptic is inside the tropic of capricorn circle, overshoot
-            # by picking x2 = rcap
-            x2 = self.RadiusCapricorn
-            y2 = slope * x2 + self.ecliptic_pole
-            constructionLine = Line(complex(0, self.ecliptic_pole), complex(x2, y2))
-        elif x0 < 0.0:
-            slope = (y0 - self.ecliptic_pole) / x0
-            # Draw line through equator division and ecliptic pole.
-            # Since the ecliptic is inside the tropic of capricorn circle, overshoot
-            # by picking x2 = rcap
-            x2 = -self.RadiusCapricorn
-            y2 = slope * x2 + self.ecliptic_pole
-            constructionLine = Line(complex(0, self.ecliptic_pole), complex(x2, y2))
-        else:
-            constructionLine = Line(
-                complex(0, self.ecliptic_pole), complex(0, self.RadiusCapricorn)
+    def ecliptic_graduations(self, step):
+        """
+        ecliptic_divisions for every step degrees of equator angle, from the
+        ecliptic scale's shared graduations, in order of angle from 0.
+        """
+        graduations = self.ecliptic_scale().graduations(step)
+        angles = (graduations["longitude"] + 180) % 360
+        order = np.argsort(angles, kind="stable")
+        return [
+            {"angle": angle, "x2": x, "y2": y}
+            for angle, x, y in zip(
+                angles[order].tolist(),
+                graduations["x"][order].tolist(),
+                graduations["y"][order].tolist(),
             )
-
-        intersections = []
-        for (T1, seg1, t1), (T2, seg2, t2) in self.ecliptic_path.intersect(
-            constructionLine
-        ):
-            p = self.ecliptic_path.point(T1)
-            intersections.append(p)
-
-        intersections = [i for i in intersections if i is not None]
-        intersections = list(set([(p.real, p.imag) for p in intersections]))
-
-        match_list = []
-        while len(intersections) > 0:
-            p = intersections.pop()
-            l = [p]
-            for m, q in enumerate(intersections):
-                if math.isclose(p[0], q[0], abs_tol=0.01) and math.isclose(
-                    p[1], q[1], abs_tol=0.01
-                ):
-                    l.append(q)
-                    intersections.pop(m)
-            match_list.append(l)
-
-        match_list = [
-            {"angle": constructionAngle, "x2": m[0][0], "y2": m[0][1]}
-            for m in match_list
         ]
-        return match_list[0]
+
+    def ecliptic_division(self, constructionAngle=None):
+        return self.ecliptic_divisions([constructionAngle])[0]
+
+    def seasonal_arc_path(self, division, next_division):
+        """
+        Path data running back along the ecliptic from next_division to
+        division, for text set along the arc between them.
+        """
+        return arc_path(
+            (next_division["x2"], next_division["y2"]),
+            (division["x2"], division["y2"]),
+            self.RadiusEcliptic,
+            large_arc=True,
+            sweep=True,
+        )
 
 
-def main():
+def render(year=2020, precision=None):
+    """
+    The astrolabe SVG, with sun and moon markers for year. With a precision
+    (decimal places), the compact form: ticks and ecliptic divisions merged
+    into one path per kind and numbers rounded (see svgcompact).
+    """
 
     plate_parameters = {"Hawaiian Islands": 21.3069}
-    astrolabe = Astrolabe(plate_parameters=plate_parameters)
+    with instrument.span("astrolabe.geometry"):
+        astrolabe = Astrolabe(plate_parameters=plate_parameters)
     plate = astrolabe.plates["Hawaiian Islands"]
 
     background_color = "#a3262a;"
@@ -385,17 +405,10 @@ def main():
         math.atan2(aries_first_point["y2"], aries_first_point["x2"])
     )
 
-    ecliptic_divisions = []
-    for angle in list(range(0, 361, 30)):
-        ecliptic_divisions.append(astrolabe.ecliptic_division(angle))
-
-    ecliptic_divisions_fine = []
-    for angle in list(range(0, 361, 10)):
-        ecliptic_divisions_fine.append(astrolabe.ecliptic_division(angle))
-
-    ecliptic_divisions_extra_fine = []
-    for angle in list(range(0, 361, 2)):
-        ecliptic_divisions_extra_fine.append(astrolabe.ecliptic_division(angle))
+    with instrument.span("astrolabe.ecliptic_divisions"):
+        ecliptic_divisions = astrolabe.ecliptic_graduations(30)
+        ecliptic_divisions_fine = astrolabe.ecliptic_graduations(10)
+        ecliptic_divisions_extra_fine = astrolabe.ecliptic_graduations(2)
 
     seasonal_arcs = []
     month_names = [
@@ -447,16 +460,6 @@ def main():
         tag = "season" + str(angle)
         angle += 30
         next_division = ecliptic_divisions[(n + 1) % 12]
-        sarc = Path(
-            Arc(
-                start=complex(division["x2"], division["y2"]),
-                radius=complex(ecliptic["r"], ecliptic["r"]),
-                rotation=0.0,
-                large_arc=True,
-                sweep=False,
-                end=complex(next_division["x2"], next_division["y2"]),
-            )
-        )
         seasonal_arcs.append(
             {
                 "tag": tag,
@@ -466,104 +469,110 @@ def main():
                 "start_y": division["y2"],
                 "end_x": next_division["x2"],
                 "end_y": next_division["y2"],
-                "reversed": sarc.reversed().d(),
+                "reversed": astrolabe.seasonal_arc_path(division, next_division),
             }
         )
 
-    stars = [
-        {"name": "aldebaran", "r": 0.7467, "theta": 68.98},
-        {"name": "altair", "r": 0.8561, "theta": 297.69542},
-        {"name": "arcturus", "r": 0.7109, "theta": 213.91500},
-        {"name": "capella", "r": 0.4040, "theta": 79.17208},
-        {"name": "sirius", "r": 1.3099, "theta": 101.28708},
-        {"name": "procyon", "r": 0.9127, "theta": 114.82542},
-        {"name": "deneb", "r": 0.4114, "theta": 310.35750},
-        {"name": "castor", "r": 0.5556, "theta": 113.64958},
-        {"name": "regulus", "r": 0.8103, "theta": 152.09250},
-        {"name": "vega", "r": 0.4793, "theta": 279.23417},
-        {"name": "betelgeuse", "r": 0.8784, "theta": 88.79292},
-        {"name": "rigel", "r": 1.1463, "theta": 78.63417},
-        {"name": "bellatrix", "r": 0.8949, "theta": 81.28250},
-        {"name": "antares", "r": 1.5870, "theta": 247.35167},
-        {"name": "spica", "r": 1.2096, "theta": 201.29792},
-    ]
+    stars = starsmod.rete_stars(astrolabe)
 
-    for star in stars:
-        star["cx"] = (
-            astrolabe.RadiusEquator * star["r"] * math.cos(math.radians(star["theta"]))
-        )
-        star["cy"] = (
-            astrolabe.RadiusEquator * star["r"] * math.sin(math.radians(star["theta"]))
+    # Sun and moon on the first of each month.
+    with instrument.span("astrolabe.sun_moon"):
+        positions = ephemeris.sun_moon_positions(
+            ephemeris.month_starts(year), astrolabe
         )
 
-    print(astrolabe.obliquity)
-
-    with open("calendrical_tools/astrolabe_template.svg.j2") as fp:
+    template_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(template_dir, "astrolabe_template.svg.j2")) as fp:
         template_text = fp.read()
 
+    paths = None
+    if precision is not None:
+        ticks = astrolabe.ticks
+        paths = {
+            "short_ticks": svgcompact.radial_path(
+                ticks["short_tick_angles"],
+                ticks["inner_radius"],
+                ticks["center_radius"],
+                precision,
+            ),
+            "long_ticks": svgcompact.radial_path(
+                ticks["long_tick_angles"],
+                ticks["inner_radius"],
+                ticks["outer_radius"],
+                precision,
+            ),
+            "divisions": svgcompact.divisions_path(ecliptic_divisions, precision),
+            "divisions_fine": svgcompact.divisions_path(
+                ecliptic_divisions_fine, precision
+            ),
+            "divisions_extra_fine": svgcompact.divisions_path(
+                ecliptic_divisions_extra_fine, precision
+            ),
+        }
+
     template = Template(template_text)
-    svg = template.render(
-        place_name=plate["location"],
-        latitude=plate["latitude"],
-        RCapricorn=astrolabe.RadiusCapricorn,
-        REquator=astrolabe.RadiusEquator,
-        RCancer=astrolabe.RadiusCancer,
-        horiz=plate["horizon"],
-        almucantar_coords=plate["almucantars"],
-        almucantar_center=plate["almucantar_center"],
-        azimuth_coords=plate["azimuths"],
-        prime_vertical=plate["prime_vertical"],
-        ticks=astrolabe.ticks,
-        ecliptic=ecliptic,
-        ecliptic_divisions=ecliptic_divisions,
-        ecliptic_divisions_fine=ecliptic_divisions_fine,
-        ecliptic_divisions_extra_fine=ecliptic_divisions_extra_fine,
-        aries_first_point=aries_first_point,
-        aries_first_point_angle=astrolabe.obliquity,
-        top_middle_outer=top_middle_outer,
-        bottom_middle_outer=bottom_middle_outer,
-        outer_radius=outer_radius,
-        inner_radius=inner_radius,
-        top_middle_inner=top_middle_inner,
-        bottom_middle_inner=bottom_middle_inner,
-        # ecliptic_center=ecliptic_center,
-        ecliptic_pole=astrolabe.ecliptic_pole,
-        seasonal_arcs=seasonal_arcs,
-        stars=stars,
-        stroke_color=stroke_color,
-        background_color=background_color,
-        graph_color=graph_color,
-        inkscape=inkscape_attributes,
-        animation=animation_parameters,
-        moons=[
-            (44.142706092611434, 214.41520455448494),
-            (-64.29833725607341, 244.05007530120906),
-            (19.338217263234128, 274.11533327404277),
-            (17.224801417675735, 304.36003467896535),
-            (-64.16194195841945, 334.4763799297398),
-            (-25.561893428663097, 4.203505420431007),
-        ],
-        suns=[
-            214.41713740391424,
-            244.05065884583018,
-            274.1147430450437,
-            304.35973321930214,
-            334.47736243435793,
-            4.204523538166541,
-        ],
-    )
+    with instrument.span("astrolabe.template"):
+        svg = template.render(
+            place_name=plate["location"],
+            latitude=plate["latitude"],
+            RCapricorn=astrolabe.RadiusCapricorn,
+            REquator=astrolabe.RadiusEquator,
+            RCancer=astrolabe.RadiusCancer,
+            horiz=plate["horizon"],
+            almucantar_coords=plate["almucantars"],
+            almucantar_center=plate["almucantar_center"],
+            azimuth_coords=plate["azimuths"],
+            prime_vertical=plate["prime_vertical"],
+            ticks=astrolabe.ticks,
+            ecliptic=ecliptic,
+            ecliptic_divisions=ecliptic_divisions,
+            ecliptic_divisions_fine=ecliptic_divisions_fine,
+            ecliptic_divisions_extra_fine=ecliptic_divisions_extra_fine,
+            aries_first_point=aries_first_point,
+            aries_first_point_angle=astrolabe.obliquity,
+            top_middle_outer=top_middle_outer,
+            bottom_middle_outer=bottom_middle_outer,
+            outer_radius=outer_radius,
+            inner_radius=inner_radius,
+            top_middle_inner=top_middle_inner,
+            bottom_middle_inner=bottom_middle_inner,
+            # ecliptic_center=ecliptic_center,
+            ecliptic_pole=astrolabe.ecliptic_pole,
+            seasonal_arcs=seasonal_arcs,
+            stars=stars,
+            stroke_color=stroke_color,
+            background_color=background_color,
+            graph_color=graph_color,
+            inkscape=inkscape_attributes,
+            animation=animation_parameters,
+            moons=positions["moon"],
+            suns=positions["sun"],
+            paths=paths,
+        )
+        if precision is not None:
+            svg = svgcompact.compact(svg, precision)
+
+    return svg
 
-    with open("astrolabe_generated.svg", "w") as fp:
+
+def main(year=2020, precision=None):
+    svg = render(year, precision)
+
+    with instrument.span("astrolabe.write"), open("astrolabe_generated.svg", "w") as fp:
         fp.write(svg)
 
     import jinja2
+    import markupsafe
+
+    # jinja2 3.0 renamed contextfunction to pass_context.
+    pass_context = getattr(jinja2, "pass_context", None) or jinja2.contextfunction
 
     # Seems like overkill, but adds "include_file" function to jinja2
     # environment in order to include raw svg into an html template.
-    @jinja2.contextfunction
+    @pass_context
     def include_file(ctx, name):
         env = ctx.environment
-        return jinja2.Markup(env.loader.get_source(env, name)[0])
+        return markupsafe.Markup(env.loader.get_source(env, name)[0])
 
     loader = jinja2.PackageLoader(__name__, ".")
     env = jinja2.Environment(loader=loader)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Timing spans and counters for the candybar and astrolabe pipelines.
+
+Instrumented code marks its stages with
+
+    with instrument.span("candybar.new_moons"):
+        ...
+
+and counts events with instrument.count("pycalcal.nth_new_moon"). Both go to
+the current recorder. The default Recorder does nothing, so the hooks cost a
+function call when nobody is listening. To collect numbers, install a Timer
+(or use recording()), then export it with log_report or write_json. Wrap a
+run in profiled() for a cProfile dump as well.
+"""
+
+import contextlib
+import cProfile
+import json
+import logging
+import time
+
+_null_span = contextlib.nullcontext()
+
+
+class Recorder:
+    """Discards everything; the default recorder."""
+
+    def span(self, name):
+        return _null_span
+
+    def count(self, name, n=1):
+        pass
+
+    def snapshot(self):
+        return {"spans": {}, "counters": {}}
+
+    def merge(self, snapshot):
+        pass
+
+
+class Timer(Recorder):
+    """Accumulates the calls and wall-clock seconds of each span, and counters."""
+
+    def __init__(self):
+        # name -> [calls, seconds]
+        self.spans = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        """Plain dict of the spans and counters, safe to pickle or dump as JSON."""
+        return {
+            "spans": {
+                name: {"calls": calls, "seconds": seconds}
+                for name, (calls, seconds) in sorted(self.spans.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def merge(self, snapshot):
+        """Add in a snapshot, e.g. one returned by a worker process."""
+        for name, entry in snapshot["spans"].items():
+            mine = self.spans.setdefault(name, [0, 0.0])
+            mine[0] += entry["calls"]
+            mine[1] += entry["seconds"]
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+
+
+recorder = Recorder()
+
+
+def get_recorder():
+    return recorder
+
+
+def set_recorder(new_recorder):
+    """Install new_recorder (None for the no-op one); returns the previous one."""
+    global recorder
+    previous = recorder
+    recorder = Recorder() if new_recorder is None else new_recorder
+    return previous
+
+
+def span(name):
+    return recorder.span(name)
+
+
+def count(name, n=1):
+    recorder.count(name, n)
+
+
+@contextlib.contextmanager
+def recording(new_recorder=None):
+    """Record into a Timer (or new_recorder) for the duration of the block."""
+    new_recorder = Timer() if new_recorder is None else new_recorder
+    previous = set_recorder(new_recorder)
+    try:
+        yield new_recorder
+    finally:
+        set_recorder(previous)
+
+
+def progress(iterable, enabled=False, **kwargs):
+    """Wrap iterable in a tqdm progress bar when enabled."""
+    if not enabled:
+        return iterable
+    from tqdm import tqdm
+
+    return tqdm(iterable, **kwargs)
+
+
+def format_report(timer):
+    snapshot = timer.snapshot()
+    lines = []
+    for name, entry in snapshot["spans"].items():
+        lines.append(
+            "{:<48} {:6d} calls {:10.4f}s".format(
+                name, entry["calls"], entry["seconds"]
+            )
+        )
+    for name, n in snapshot["counters"].items():
+        lines.append("{:<48} {:6d}".format(name, n))
+    return "\n".join(lines)
+
+
+def log_report(timer, logger=None, level=logging.INFO):
+    logger = logging.getLogger(__name__) if logger is None else logger
+    for line in format_report(timer).splitlines():
+        logger.log(level, line)
+
+
+def write_json(timer, path):
+    with open(path, "w") as fp:
+        json.dump(timer.snapshot(), fp, indent=2)
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """Run the block under cProfile, writing pstats data to path if given."""
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if path is not None:
+            profile.dump_stats(path)
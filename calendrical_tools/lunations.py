@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Table of new moon moments indexed by lunation number.
+
+pcc.nth_new_moon is one of the most expensive calls in pycalcal, and every
+candybar needs the new moons of a year or so. NewMoonTable holds the moments
+of every lunation in a span of years as one float64 array, indexed by the
+same lunation numbers as pcc.nth_new_moon (lunation 0 is the new moon of
+January 11, 1 CE). Moments are filled in a block at a time the first time a
+query touches them and are then shared by every later query, so adjacent
+years reuse each other's moons. "All new moons between fixed dates a and b"
+is a binary search over the array.
+
+The table grows, keeping the moments it already has, when a query reaches
+past either end, so the span given to it is where it starts, not a limit.
+"""
+
+import numpy as np
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import astronomy
+
+
+# Days kept either side of the span, so that the candybar windows of its
+# first and last years (which start weeks before January 1 and can end
+# after December 31) are inside the table.
+padding = 7 * 12
+
+
+class NewMoonTable:
+    block = 64
+
+    def __init__(self, start_year=-1000, end_year=3000):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.epoch = pcc.nth_new_moon(0)
+        start = pcc.fixed_from_gregorian([start_year, 1, 1]) - padding
+        end = pcc.fixed_from_gregorian([end_year + 1, 1, 1]) + padding
+        self.first, last = self.lunations(start, end)
+        self.moments = np.full(last - self.first + 1, np.nan)
+        self.sidereal_longitudes = np.full(len(self.moments), np.nan)
+
+    def estimate_lunation(self, fixed_date):
+        """Lunation number of the mean new moon nearest fixed_date."""
+        return int(round((fixed_date - self.epoch) / pcc.MEAN_SYNODIC_MONTH))
+
+    def lunations(self, a, b):
+        """
+        First and last lunation that can have its new moon between fixed
+        dates a and b. True new moons are within a day of the mean ones, so
+        two lunations either side of the estimates is enough.
+        """
+        return self.estimate_lunation(a) - 2, self.estimate_lunation(b) + 2
+
+    def extend(self, lo, hi):
+        """Grow the table so that it holds lunations lo..hi inclusive."""
+        last = self.first + len(self.moments) - 1
+        before = max(self.first - lo, 0)
+        after = max(hi - last, 0)
+        if before or after:
+            self.moments = np.concatenate(
+                [np.full(before, np.nan), self.moments, np.full(after, np.nan)]
+            )
+            self.sidereal_longitudes = np.concatenate(
+                [
+                    np.full(before, np.nan),
+                    self.sidereal_longitudes,
+                    np.full(after, np.nan),
+                ]
+            )
+            self.first -= before
+        return self
+
+    def extend_years(self, start_year, end_year):
+        """Grow the table to cover the Gregorian years, padded as in __init__."""
+        start = pcc.fixed_from_gregorian([start_year, 1, 1]) - padding
+        end = pcc.fixed_from_gregorian([end_year + 1, 1, 1]) + padding
+        self.extend(*self.lunations(start, end))
+        self.start_year = min(self.start_year, start_year)
+        self.end_year = max(self.end_year, end_year)
+        return self
+
+    def _index(self, n):
+        i = n - self.first
+        if not 0 <= i < len(self.moments):
+            raise ValueError(
+                "lunation {} is outside the table for years {} to {}".format(
+                    n, self.start_year, self.end_year
+                )
+            )
+        return i
+
+    def fill(self, lo, hi):
+        """Make sure moments are computed for lunations lo..hi inclusive."""
+        self.extend(lo, hi)
+        i = self._index(lo) // self.block * self.block
+        j = self._index(hi)
+        while i <= j:
+            stop = min(i + self.block, len(self.moments))
+            if np.isnan(self.moments[i:stop]).any():
+                for k in range(i, stop):
+                    self.moments[k] = astronomy.nth_new_moon(self.first + k)
+            i = stop
+
+    def moment(self, n):
+        self.fill(n, n)
+        return self.moments[self._index(n)]
+
+    def between(self, a, b):
+        """
+        Lunation numbers and moments of the new moons with a <= moment < b.
+        """
+        lo, hi = self.lunations(a, b)
+        self.fill(lo, hi)
+        moments = self.moments[self._index(lo) : self._index(hi) + 1]
+        i = np.searchsorted(moments, a, side="left")
+        j = np.searchsorted(moments, b, side="left")
+        return np.arange(lo + i, lo + j), moments[i:j]
+
+    def sidereal_longitude(self, n):
+        """Sidereal lunar longitude at new moon n, computed on first use."""
+        moment = self.moment(n)
+        i = self._index(n)
+        if np.isnan(self.sidereal_longitudes[i]):
+            self.sidereal_longitudes[i] = astronomy.sidereal_lunar_longitude(moment)
+        return self.sidereal_longitudes[i]
+
+    def save(self, path):
+        np.savez(
+            path,
+            span=[self.start_year, self.end_year, self.first],
+            epoch=self.epoch,
+            moments=self.moments,
+            sidereal_longitudes=self.sidereal_longitudes,
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        table = cls.__new__(cls)
+        table.start_year, table.end_year, table.first = (int(v) for v in data["span"])
+        table.epoch = float(data["epoch"])
+        table.moments = data["moments"]
+        table.sidereal_longitudes = data["sidereal_longitudes"]
+        return table
+
+
+default_table = None
+
+
+def get_default_table(start_year=None, end_year=None):
+    """
+    The shared NewMoonTable, grown to cover Gregorian years start_year to
+    end_year if they are given and outside it.
+    """
+    global default_table
+    if default_table is None:
+        default_table = NewMoonTable()
+    if start_year is not None:
+        if end_year is None:
+            end_year = start_year
+        default_table.extend_years(start_year, end_year)
+    return default_table
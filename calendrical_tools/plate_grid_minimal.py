@@ -1,7 +1,10 @@
 import math
+import os
+
 import jinja2
 
 from calendrical_tools.generate_astrolabe import *
+from calendrical_tools import stars as starsmod
 
 obliquity = 23.4443291
 RadiusCapricorn = 100
@@ -113,17 +116,9 @@ def main():
         math.atan2(aries_first_point["y2"], aries_first_point["x2"])
     )
 
-    ecliptic_divisions = []
-    for angle in list(range(0, 361, 30)):
-        ecliptic_divisions.append(astrolabe.ecliptic_division(angle))
-
-    ecliptic_divisions_fine = []
-    for angle in list(range(0, 361, 10)):
-        ecliptic_divisions_fine.append(astrolabe.ecliptic_division(angle))
-
-    ecliptic_divisions_extra_fine = []
-    for angle in list(range(0, 361, 2)):
-        ecliptic_divisions_extra_fine.append(astrolabe.ecliptic_division(angle))
+    ecliptic_divisions = astrolabe.ecliptic_divisions(range(0, 361, 30))
+    ecliptic_divisions_fine = astrolabe.ecliptic_divisions(range(0, 361, 10))
+    ecliptic_divisions_extra_fine = astrolabe.ecliptic_divisions(range(0, 361, 2))
 
     seasonal_names = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12"]
     seasonal_names = [
@@ -147,16 +142,6 @@ def main():
         tag = "season" + str(angle)
         angle += 30
         next_division = ecliptic_divisions[(n + 1) % 12]
-        sarc = Path(
-            Arc(
-                start=complex(division["x2"], division["y2"]),
-                radius=complex(ecliptic["r"], ecliptic["r"]),
-                rotation=0.0,
-                large_arc=True,
-                sweep=False,
-                end=complex(next_division["x2"], next_division["y2"]),
-            )
-        )
         seasonal_arcs.append(
             {
                 "tag": tag,
@@ -166,48 +151,33 @@ def main():
                 "start_y": division["y2"],
                 "end_x": next_division["x2"],
                 "end_y": next_division["y2"],
-                "reversed": sarc.reversed().d(),
+                "reversed": astrolabe.seasonal_arc_path(division, next_division),
             }
         )
 
-    stars = [
-        {"name":"aldebaran",  "r": 0.7467, "theta": 68.98},
-        {"name":"altair",     "r": 0.8561, "theta": 297.69542},
-        {"name":"arcturus",   "r": 0.7109, "theta": 213.91500},
-        {"name":"capella",    "r": 0.4040, "theta": 79.17208},
-        {"name":"sirius",     "r": 1.3099, "theta": 101.28708},
-        {"name":"procyon",    "r": 0.9127, "theta":114.82542},
-        {"name":"deneb",      "r": 0.4114, "theta": 310.35750},
-        {"name":"castor",     "r": 0.5556, "theta": 113.64958},
-        {"name":"regulus",    "r": 0.8103, "theta": 152.09250},
-        {"name":"vega",       "r": 0.4793, "theta": 279.23417},
-        {"name":"betelgeuse", "r": 0.8784, "theta": 88.79292},
-        {"name":"rigel",      "r": 1.1463, "theta": 78.63417},
-        {"name":"bellatrix",  "r": 0.8949, "theta": 81.28250},
-        {"name":"antares",    "r": 1.5870, "theta": 247.35167},
-        {"name":"spica",      "r": 1.2096, "theta": 201.29792}
-    ]
-
-    for star in stars:
-        star["cx"] = astrolabe.RadiusEquator * star["r"] * math.cos(math.radians(star["theta"]))
-        star["cy"] = astrolabe.RadiusEquator * star["r"] * math.sin(math.radians(star["theta"]))
+    stars = starsmod.rete_stars(astrolabe)
 
     import jinja2
+    import markupsafe
+
+    # jinja2 3.0 renamed contextfunction to pass_context.
+    pass_context = getattr(jinja2, "pass_context", None) or jinja2.contextfunction
 
     # Seems like overkill, but adds "include_file" function to jinja2
     # environment in order to include raw svg into an html template.
-    @jinja2.contextfunction
+    @pass_context
     def include_file(ctx, name):
         env = ctx.environment
-        return jinja2.Markup(env.loader.get_source(env, name)[0])
+        return markupsafe.Markup(env.loader.get_source(env, name)[0])
 
-    loader = jinja2.PackageLoader(__name__, ".")
+    # PackageLoader cannot find __main__ when this is run as a script.
+    loader = jinja2.FileSystemLoader(os.path.dirname(os.path.abspath(__file__)))
     env = jinja2.Environment(loader=loader)
     env.globals["include_file"] = include_file
 
     print(seasonal_arcs)
 
-    svg = env.get_template("plate_template.svg").render(
+    svg = env.get_template("plate_template.svg.j2").render(
         stroke_color="#859e6d",
         fill_color="#eafee7",
         ecliptic_stroke_color="#f5ac27;",
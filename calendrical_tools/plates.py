@@ -0,0 +1,529 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Astrolabe plate geometry for many latitudes at once.
+
+plate_geometry evaluates the plate grid equations (horizon, almucantars,
+azimuths and prime vertical) for an array of latitudes in one pass. It
+returns a PlateSet of NumPy arrays of circle centres and radii, with one row
+per latitude. render_plates writes an SVG plate grid for each latitude,
+spread over worker processes. plate_to_horizontal goes the other way, from
+points on a plate back to altitude and azimuth.
+
+    python -m calendrical_tools.plates --start 1 --stop 66 --step 0.1 --jobs 4
+
+The equator (latitude 0) has a straight-line horizon and no finite plate.
+"""
+
+import collections
+import hashlib
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from jinja2 import Template
+import click
+import numpy as np
+
+from calendrical_tools import cache as cachemod
+from calendrical_tools import instrument
+from calendrical_tools import svgcompact
+
+plate_template_text = """<svg viewBox="{{ -size }} {{ -size }} {{ 2 * size }} {{ 2 * size }}" width="{{ 2 * size }}" height="{{ 2 * size }}"
+     xmlns="http://www.w3.org/2000/svg">
+    <title>Plate for latitude {{ "%.4f"|format(latitude) }}</title>
+    <defs>
+        <clipPath id="capricorn"><circle cx="0" cy="0" r="{{ RCapricorn }}"/></clipPath>
+        <clipPath id="horizon"><circle cx="{{ horiz.cx }}" cy="{{ horiz.cy }}" r="{{ horiz.r }}"/></clipPath>
+    </defs>
+    <g transform="scale(1, -1)" stroke="{{ stroke_color }}" stroke-width="0.5" fill="none">
+        <circle cx="0" cy="0" r="{{ RCapricorn }}"/>
+        <circle cx="0" cy="0" r="{{ REquator }}"/>
+        <circle cx="0" cy="0" r="{{ RCancer }}"/>
+        <line x1="{{ -RCapricorn }}" y1="0" x2="{{ RCapricorn }}" y2="0"/>
+        <line x1="0" y1="{{ -RCapricorn }}" x2="0" y2="{{ RCapricorn }}"/>
+        <g clip-path="url(#capricorn)">
+            <circle cx="{{ horiz.cx }}" cy="{{ horiz.cy }}" r="{{ horiz.r }}"/>
+            <g clip-path="url(#horizon)">
+            {%- for coord in almucantar_coords %}
+                <circle cx="{{ coord.cx }}" cy="{{ coord.cy }}" r="{{ coord.r }}"/>
+            {%- endfor %}
+            {%- for coord in azimuth_coords %}
+                <circle cx="{{ coord.cx }}" cy="{{ coord.cy }}" r="{{ coord.r }}"/>
+            {%- endfor %}
+                <circle cx="{{ prime_vertical.cx }}" cy="{{ prime_vertical.cy }}" r="{{ prime_vertical.r }}"/>
+            </g>
+        </g>
+    </g>
+</svg>
+"""
+
+plate_template = Template(plate_template_text)
+
+
+class PlateSet:
+    """
+    Plate grid circles for n latitudes. Per-latitude values are arrays of
+    shape (n,); almucantars are (n, len(altitudes)) and azimuths are
+    (n, len(azimuths)). The left azimuth circle of each pair has centre x
+    azimuth_cx, and the right one has -azimuth_cx.
+
+    rows, if given, are the packed values from a previous PlateSet.rows(),
+    and are used instead of evaluating the equations.
+    """
+
+    def __init__(self, latitudes, altitudes, azimuths, radius_equator, rows=None):
+        self.latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        # The grids are kept as given too, for labels in the plate dicts.
+        self.altitude_grid = list(altitudes)
+        self.azimuth_grid = list(azimuths)
+        self.altitudes = np.asarray(self.altitude_grid, dtype=float)
+        self.azimuths = np.asarray(self.azimuth_grid, dtype=float)
+        self.radius_equator = radius_equator
+        if rows is None:
+            self._compute()
+        else:
+            rows = np.asarray(rows, dtype=float)
+            self._unpack(rows.reshape(len(self.latitudes), -1))
+
+    def _compute(self):
+        radius_equator = self.radius_equator
+        phi = np.radians(self.latitudes)[:, None]
+        sin_phi = np.sin(phi)
+
+        self.horizon_cy = (radius_equator / np.tan(phi))[:, 0]
+        self.horizon_r = (radius_equator / sin_phi)[:, 0]
+
+        # Plate grid equation 2, circles of equal altitude (almucantars).
+        alt = np.radians(self.altitudes)[None, :]
+        self.almucantar_cy = radius_equator * (
+            np.cos(phi) / (sin_phi + np.sin(alt))
+        )
+        self.almucantar_r = radius_equator * (np.cos(alt) / (sin_phi + np.sin(alt)))
+
+        # Plate grid equation 3, circles of azimuth.
+        y_zenith = radius_equator * np.tan(np.radians((90 - self.latitudes) / 2.0))
+        y_nadir = -radius_equator * np.tan(np.radians((90 + self.latitudes) / 2.0))
+        self.azimuth_cy = (y_zenith + y_nadir) / 2.0
+        y_azimuth = ((y_zenith - y_nadir) / 2.0)[:, None]
+        az = np.radians(self.azimuths)[None, :]
+        self.azimuth_cx = y_azimuth * np.tan(az)
+        self.azimuth_r = y_azimuth / np.cos(az)
+
+        # The prime vertical is the 90 degree azimuth circle, centred on the meridian.
+        self.prime_vertical_cy = self.azimuth_cy.copy()
+        self.prime_vertical_r = y_azimuth[:, 0]
+
+    def rows(self):
+        """
+        All of the circles packed into one float64 array, a row per latitude:
+        horizon cy and r, azimuth cy, prime vertical cy and r, then the
+        almucantar cy and r and azimuth cx and r columns.
+        """
+        return np.column_stack(
+            [
+                self.horizon_cy,
+                self.horizon_r,
+                self.azimuth_cy,
+                self.prime_vertical_cy,
+                self.prime_vertical_r,
+                self.almucantar_cy,
+                self.almucantar_r,
+                self.azimuth_cx,
+                self.azimuth_r,
+            ]
+        )
+
+    def _unpack(self, rows):
+        k, m = len(self.altitudes), len(self.azimuths)
+        (
+            self.horizon_cy,
+            self.horizon_r,
+            self.azimuth_cy,
+            self.prime_vertical_cy,
+            self.prime_vertical_r,
+        ) = rows[:, :5].T
+        self.almucantar_cy = rows[:, 5 : 5 + k]
+        self.almucantar_r = rows[:, 5 + k : 5 + 2 * k]
+        self.azimuth_cx = rows[:, 5 + 2 * k : 5 + 2 * k + m]
+        self.azimuth_r = rows[:, 5 + 2 * k + m : 5 + 2 * k + 2 * m]
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def take(self, indices):
+        """A PlateSet of just the latitudes at indices."""
+        return PlateSet(
+            self.latitudes[indices],
+            self.altitude_grid,
+            self.azimuth_grid,
+            self.radius_equator,
+            rows=self.rows()[indices],
+        )
+
+    def plate(self, i, location=None):
+        """Plate i as the dict Astrolabe.plate builds."""
+        horizon = {
+            "cx": 0.0,
+            "cy": float(self.horizon_cy[i]),
+            "r": float(self.horizon_r[i]),
+        }
+        almucantars = [
+            {"alt": alt, "cx": 0, "cy": cy, "r": r}
+            for alt, cy, r in zip(
+                self.altitude_grid,
+                self.almucantar_cy[i].tolist(),
+                self.almucantar_r[i].tolist(),
+            )
+        ]
+        azimuths = []
+        cy = float(self.azimuth_cy[i])
+        for az, cx, r in zip(
+            self.azimuth_grid,
+            self.azimuth_cx[i].tolist(),
+            self.azimuth_r[i].tolist(),
+        ):
+            azimuths.append({"az": az, "cx": cx, "cy": cy, "r": r})
+            azimuths.append({"az": az, "cx": -cx, "cy": cy, "r": r})
+        prime_vertical = {
+            "az": 90,
+            "cx": 0,
+            "cy": float(self.prime_vertical_cy[i]),
+            "r": float(self.prime_vertical_r[i]),
+        }
+        return {
+            "location": location,
+            "latitude": float(self.latitudes[i]),
+            "horizon": horizon,
+            "almucantars": almucantars,
+            "prime_vertical": prime_vertical,
+            "azimuths": azimuths,
+        }
+
+
+def plate_geometry(
+    latitudes,
+    altitudes=range(0, 90, 10),
+    azimuths=range(10, 90, 10),
+    radius_equator=None,
+    obliquity=23.4443291,
+    radius_capricorn=100,
+):
+    """
+    Evaluate the plate grid for every latitude in one go. radius_equator
+    defaults to the one implied by obliquity and radius_capricorn.
+    """
+    if radius_equator is None:
+        radius_equator = radius_equator_for(obliquity, radius_capricorn)
+    return PlateSet(latitudes, altitudes, azimuths, radius_equator)
+
+
+def radius_equator_for(obliquity, radius_capricorn):
+    return radius_capricorn * math.tan(math.radians((90 - obliquity) / 2))
+
+
+def plate_to_horizontal(x, y, latitude, radius_equator):
+    r"""
+    Altitude and azimuth of the sky at plate points (x, y), for a plate
+    made for latitude. Returns (altitude, azimuth, declination, hour_angle)
+    arrays in degrees. All arguments broadcast together, so a batch of
+    pointer samples can be handled in one call.
+
+    The plate's own coordinates are used, before the SVG scale(1, -1): the
+    pole is at the centre, the meridian runs along +y toward the south point
+    of the horizon, and east is toward -x. Azimuth is measured from north
+    through east, in [0, 360). Hour angle is positive to the west, in
+    (-180, 180]. Points outside the horizon circle have negative altitude.
+    In these terms the azimuth circle centred at x = y_{azimuth} \tan(az) is
+    the vertical through azimuths 90 - az and 270 - az.
+
+    Inverting the stereographic projection:
+        \delta = 90 - 2\arctan(\frac{\sqrt{x^2 + y^2}}{R_{Equator}}), H = \arctan2(x, y)
+        \sin a = \sin\phi\sin\delta + \cos\phi\cos\delta\cos H
+        \tan A = \frac{-\cos\delta\sin H}{\cos\phi\sin\delta - \sin\phi\cos\delta\cos H}
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    phi = np.radians(np.asarray(latitude, dtype=float))
+
+    dec = np.pi / 2 - 2 * np.arctan(np.hypot(x, y) / radius_equator)
+    ha = np.arctan2(x, y)
+
+    sin_dec, cos_dec = np.sin(dec), np.cos(dec)
+    cos_ha = np.cos(ha)
+    alt = np.arcsin(
+        np.clip(np.sin(phi) * sin_dec + np.cos(phi) * cos_dec * cos_ha, -1, 1)
+    )
+    az = np.arctan2(
+        -cos_dec * np.sin(ha), np.cos(phi) * sin_dec - np.sin(phi) * cos_dec * cos_ha
+    )
+    return (
+        np.degrees(alt),
+        np.degrees(az) % 360,
+        np.degrees(dec),
+        np.degrees(ha),
+    )
+
+
+def horizontal_to_plate(altitude, azimuth, latitude, radius_equator):
+    """
+    Plate points (x, y) of altitudes and azimuths (degrees) for a plate made
+    for latitude: the inverse of plate_to_horizontal, with the same
+    conventions. Returns (x, y) arrays.
+    """
+    alt = np.radians(np.asarray(altitude, dtype=float))
+    az = np.radians(np.asarray(azimuth, dtype=float))
+    phi = np.radians(np.asarray(latitude, dtype=float))
+
+    sin_dec = np.sin(phi) * np.sin(alt) + np.cos(phi) * np.cos(alt) * np.cos(az)
+    dec = np.arcsin(np.clip(sin_dec, -1, 1))
+    ha = np.arctan2(
+        -np.cos(alt) * np.sin(az),
+        np.cos(phi) * np.sin(alt) - np.sin(phi) * np.cos(alt) * np.cos(az),
+    )
+    r = radius_equator * np.tan((np.pi / 2 - dec) / 2)
+    return r * np.sin(ha), r * np.cos(ha)
+
+
+class PlateCache:
+    """
+    Plate geometry keyed on the quantized (obliquity, radius_capricorn,
+    latitude, altitude grid, azimuth grid), held in memory with LRU eviction
+    and, if a directory is given, on disk as well.
+
+    Latitudes are rounded to precision decimal places (1e-4 degrees, about
+    11 m, by default), so requests that differ only further down share one
+    entry, computed at the rounded latitude. On disk each entry is the raw
+    little-endian float64 row of PlateSet.rows(), kept in a cache.FileStore.
+    """
+
+    def __init__(
+        self, capacity=4096, directory=None, max_bytes=16 * 2 ** 20, precision=4
+    ):
+        self.capacity = capacity
+        self.directory = None if directory is None else Path(directory)
+        self.max_bytes = max_bytes
+        self.store = None
+        if directory is not None:
+            self.store = cachemod.FileStore(directory, ".f8", max_bytes, binary=True)
+        self.precision = precision
+        self.entries = collections.OrderedDict()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def key(self, obliquity, radius_capricorn, latitude, altitudes, azimuths):
+        return (
+            round(float(obliquity), 7),
+            round(float(radius_capricorn), 7),
+            round(float(latitude), self.precision),
+            tuple(float(a) for a in altitudes),
+            tuple(float(a) for a in azimuths),
+        )
+
+    def name(self, key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+    def get(self, key, width):
+        """The packed row for key, or None on a miss."""
+        row = self.entries.get(key)
+        if row is not None:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            instrument.count("plate_cache.hits")
+            return row
+        if self.store is not None:
+            row = self.store.read(
+                self.name(key), lambda fp: np.frombuffer(fp.read(), dtype="<f8")
+            )
+            if row is not None and len(row) == width:
+                self.stats["disk_hits"] += 1
+                instrument.count("plate_cache.disk_hits")
+                self._remember(key, row)
+                return row
+        self.stats["misses"] += 1
+        instrument.count("plate_cache.misses")
+        return None
+
+    def put(self, key, row):
+        row = np.ascontiguousarray(row, dtype="<f8")
+        self._remember(key, row)
+        if self.store is not None:
+            self.store.write(self.name(key), lambda fp: fp.write(row.tobytes()))
+
+    def _remember(self, key, row):
+        self.entries[key] = row
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def evict(self):
+        """Remove least recently used files until under max_bytes."""
+        if self.store is not None:
+            self.store.evict()
+
+    def plate_set(
+        self,
+        latitudes,
+        altitudes=range(0, 90, 10),
+        azimuths=range(10, 90, 10),
+        obliquity=23.4443291,
+        radius_capricorn=100,
+    ):
+        """Like plate_geometry, computing only the latitudes not cached."""
+        altitudes, azimuths = list(altitudes), list(azimuths)
+        radius_equator = radius_equator_for(obliquity, radius_capricorn)
+        keys = [
+            self.key(obliquity, radius_capricorn, latitude, altitudes, azimuths)
+            for latitude in np.atleast_1d(latitudes).tolist()
+        ]
+        width = 5 + 2 * len(altitudes) + 2 * len(azimuths)
+        rows = np.empty((len(keys), width))
+        missing = []
+        for i, key in enumerate(keys):
+            row = self.get(key, width)
+            if row is None:
+                missing.append(i)
+            else:
+                rows[i] = row
+        if missing:
+            computed = PlateSet(
+                [keys[i][2] for i in missing], altitudes, azimuths, radius_equator
+            ).rows()
+            rows[missing] = computed
+            for i, row in zip(missing, computed):
+                self.put(keys[i], row)
+            self.evict()
+        return PlateSet(
+            [key[2] for key in keys], altitudes, azimuths, radius_equator, rows=rows
+        )
+
+    def report(self):
+        return (
+            "plate cache ({} of {}): {hits} hits, {disk_hits} disk hits, "
+            "{misses} misses, {evictions} evictions"
+        ).format(len(self.entries), self.capacity, **self.stats)
+
+
+default_cache = None
+
+
+def get_default_cache():
+    """The shared in-memory PlateCache."""
+    global default_cache
+    if default_cache is None:
+        default_cache = PlateCache()
+    return default_cache
+
+
+def render_plate(
+    plate_set, i, radius_capricorn=100, stroke_color="#596581", precision=None
+):
+    """The plate SVG; compacted (see svgcompact) when given a precision."""
+    plate = plate_set.plate(i)
+    radius_equator = plate_set.radius_equator
+    radius_cancer = radius_equator * radius_equator / radius_capricorn
+    svg = plate_template.render(
+        size=radius_capricorn + 5,
+        latitude=plate["latitude"],
+        RCapricorn=radius_capricorn,
+        REquator=radius_equator,
+        RCancer=radius_cancer,
+        horiz=plate["horizon"],
+        almucantar_coords=plate["almucantars"],
+        azimuth_coords=plate["azimuths"],
+        prime_vertical=plate["prime_vertical"],
+        stroke_color=stroke_color,
+    )
+    if precision is not None:
+        svg = svgcompact.compact(svg, precision)
+    return svg
+
+
+def plate_filename(directory, latitude):
+    return os.path.join(directory, "plate_{:+08.4f}.svg".format(latitude))
+
+
+def _render_chunk(args):
+    plate_set, directory, radius_capricorn, precision = args
+    outfiles = []
+    for i in range(len(plate_set)):
+        outfile = plate_filename(directory, plate_set.latitudes[i])
+        with open(outfile, "w") as fp:
+            fp.write(
+                render_plate(plate_set, i, radius_capricorn, precision=precision)
+            )
+        outfiles.append(outfile)
+    return outfiles
+
+
+def render_plates(
+    plate_set,
+    directory="output/plates",
+    jobs=1,
+    radius_capricorn=100,
+    chunk_size=50,
+    precision=None,
+):
+    """
+    Write one SVG per latitude into directory; returns the file names.
+    Workers are handed chunk_size latitudes at a time. With a precision the
+    SVGs are compacted.
+    """
+    os.makedirs(directory, exist_ok=True)
+    chunks = [
+        (
+            plate_set.take(np.arange(i, min(i + chunk_size, len(plate_set)))),
+            directory,
+            radius_capricorn,
+            precision,
+        )
+        for i in range(0, len(plate_set), chunk_size)
+    ]
+    if jobs == 1:
+        results = map(_render_chunk, chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_render_chunk, chunks))
+    return [outfile for outfiles in results for outfile in outfiles]
+
+
+@click.command()
+@click.option("--start", default=1.0, help="First latitude.")
+@click.option("--stop", default=66.0, help="Last latitude.")
+@click.option("--step", default=1.0, help="Latitude step.")
+@click.option(
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes.",
+)
+@click.option("--output", default="output/plates", help="Directory for the SVG files.")
+@click.option("--cache", default=None, help="Directory for the plate geometry cache.")
+@click.option(
+    "--precision",
+    default=None,
+    type=int,
+    help="Round coordinates to this many decimal places (compact SVG).",
+)
+def main(start, stop, step, jobs, output, cache, precision):
+    started = time.perf_counter()
+    latitudes = np.arange(start, stop + step / 2, step)
+    if cache is None:
+        plate_set = plate_geometry(latitudes)
+    else:
+        plate_set = PlateCache(directory=cache).plate_set(latitudes)
+    computed = time.perf_counter()
+    outfiles = render_plates(
+        plate_set, directory=output, jobs=jobs, precision=precision
+    )
+    click.echo(
+        "{} plates: geometry {:.3f}s, rendering {:.2f}s".format(
+            len(outfiles), computed - started, time.perf_counter() - computed
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Star catalogues for the rete.
+
+A catalogue is a CSV file with name, ra, dec and mag columns (right
+ascension and declination in degrees). Lines starting with # are comments.
+load_catalogue reads one into NumPy arrays, and project places the stars on
+the rete, for the templates.
+
+Stars are projected stereographically from the south pole onto the plane of
+the equator, like the rest of the astrolabe: a star at declination dec lies
+at R_{Equator} \\tan(\\frac{90 - dec}{2}) from the centre, at an angle equal to its
+right ascension. Stars outside the Tropic of Capricorn fall off the rete.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+default_catalogue = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "bright_stars.csv"
+)
+
+
+def load_catalogue(path=default_catalogue):
+    """Returns a dict of name, ra, dec and mag arrays."""
+    with open(path, newline="") as fp:
+        rows = list(csv.reader(line for line in fp if not line.startswith("#")))
+    header, rows = rows[0], rows[1:]
+    columns = dict(zip(header, zip(*rows))) if rows else {h: () for h in header}
+    return {
+        "name": np.array(columns["name"], dtype=str),
+        "ra": np.array(columns["ra"], dtype=float),
+        "dec": np.array(columns["dec"], dtype=float),
+        "mag": np.array(columns["mag"], dtype=float),
+    }
+
+
+def project(catalogue, radius_equator, radius_limit=None, magnitude_limit=None):
+    """
+    Star records for the templates, in catalogue order. Each record has the
+    name, ra, dec and mag of the star, its distance r from the centre as a
+    multiple of radius_equator, theta (the right ascension), and cx and cy.
+    Stars further out than radius_limit, or fainter than magnitude_limit,
+    are left out.
+    """
+    ra = catalogue["ra"]
+    dec = catalogue["dec"]
+    mag = catalogue["mag"]
+    r = np.tan(np.radians((90 - dec) / 2))
+
+    keep = np.ones(len(ra), dtype=bool)
+    if radius_limit is not None:
+        keep &= radius_equator * r <= radius_limit
+    if magnitude_limit is not None:
+        keep &= mag <= magnitude_limit
+    index = np.flatnonzero(keep)
+
+    theta = np.radians(ra[index])
+    cx = radius_equator * r[index] * np.cos(theta)
+    cy = radius_equator * r[index] * np.sin(theta)
+
+    names = catalogue["name"][index].tolist()
+    return [
+        {
+            "name": name or "star{}".format(i),
+            "ra": a,
+            "dec": d,
+            "mag": m,
+            "r": rr,
+            "theta": a,
+            "cx": x,
+            "cy": y,
+        }
+        for i, name, a, d, m, rr, x, y in zip(
+            index.tolist(),
+            names,
+            ra[index].tolist(),
+            dec[index].tolist(),
+            mag[index].tolist(),
+            r[index].tolist(),
+            cx.tolist(),
+            cy.tolist(),
+        )
+    ]
+
+
+def rete_stars(astrolabe, path=default_catalogue, magnitude_limit=None):
+    """The catalogue's stars that fit on astrolabe's rete."""
+    return project(
+        load_catalogue(path),
+        astrolabe.RadiusEquator,
+        radius_limit=astrolabe.RadiusCapricorn,
+        magnitude_limit=magnitude_limit,
+    )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Smaller SVG output.
+
+The templates write every coordinate at full float precision
+(44.142706092611434), and draw one element per tick and ecliptic division.
+The helpers here are used by the templates' compact mode. Each family of
+identical strokes is merged into a single path of M/L segments, and the
+rendered text is then shrunk by rounding numbers to a fixed number of
+decimal places and dropping comments, indentation and blank lines.
+
+At the default precision of 2 decimal places, with a radius of 100, the
+error is at most 0.005 user units, far below a printed line width.
+"""
+
+import re
+
+import numpy as np
+
+number = re.compile(r"-?\d+\.\d+(?:[eE][-+]?\d+)?")
+indentation = re.compile(r"^[ \t]+", re.MULTILINE)
+blank_lines = re.compile(r"\n\s*\n")
+comment = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+def format_number(value, precision=2):
+    """value at precision decimal places, without trailing zeros."""
+    text = "{:.{}f}".format(value, precision)
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def round_numbers(text, precision=2):
+    """Rewrite every decimal number in text at precision decimal places."""
+    return number.sub(lambda m: format_number(float(m.group()), precision), text)
+
+
+def segments_path(x1, y1, x2, y2, precision=2):
+    """A path d attribute drawing a line segment per element of the arrays."""
+    columns = np.broadcast_arrays(
+        *(np.asarray(c, dtype=float) for c in (x1, y1, x2, y2))
+    )
+    return "".join(
+        "M{} {}L{} {}".format(*(format_number(v, precision) for v in segment))
+        for segment in zip(*(c.tolist() for c in columns))
+    )
+
+
+def radial_path(angles, inner_radius, outer_radius, precision=2):
+    """
+    The segments from inner_radius to outer_radius along the y axis, each
+    turned by one of angles (degrees), as a single path d attribute. This
+    draws the same strokes as a line used with transform="rotate(angle)".
+    """
+    theta = np.radians(np.asarray(angles, dtype=float))
+    sin, cos = np.sin(theta), np.cos(theta)
+    return segments_path(
+        -inner_radius * sin,
+        inner_radius * cos,
+        -outer_radius * sin,
+        outer_radius * cos,
+        precision,
+    )
+
+
+def divisions_path(divisions, precision=2):
+    """Lines from the centre to each division's x2, y2, as one path."""
+    return segments_path(
+        0,
+        0,
+        [d["x2"] for d in divisions],
+        [d["y2"] for d in divisions],
+        precision,
+    )
+
+
+def compact(svg, precision=2):
+    """Round the numbers in rendered svg and strip its comments and spacing."""
+    svg = comment.sub("", round_numbers(svg, precision))
+    return blank_lines.sub("\n", indentation.sub("", svg))
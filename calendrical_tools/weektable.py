@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Columnar storage for the days of a candybar.
+
+A DayTable holds the fixed days of a candybar window once, with one small
+integer array per calendar field, instead of a dict and day list per week per
+calendar. WeekList and WeekView present it in the shape the formatters
+expect: weeks[i][0] is the week's details dict ("iso", "raw" and, in weeks
+with a new moon, "new_moon" and "new_moon_fixed") and weeks[i][1] is the list
+of day numbers. Both are built only when a week is looked at.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+from calendrical_tools import batch
+
+
+class DayTable:
+    __slots__ = ("fixed", "iso_week", "new_moon", "columns")
+
+    def __init__(self, fixed, new_moon_days=()):
+        self.fixed = np.asarray(fixed, dtype=np.int32)
+        _, iso_week, _ = batch.iso_from_fixed(self.fixed[::7])
+        self.iso_week = iso_week.astype(np.int16)
+        self.new_moon = np.isin(self.fixed, list(new_moon_days))
+        # calendar type -> int16 array of shape (fields, days)
+        self.columns = {}
+
+    def add(self, calendar_type, columns=None):
+        """Add a calendar's columns, converting the days if none are given."""
+        if columns is None:
+            columns = batch.from_fixed_functions[calendar_type](self.fixed)
+        self.columns[calendar_type] = np.array(columns, dtype=np.int16)
+
+    def column(self, calendar_type):
+        if calendar_type not in self.columns:
+            self.add(calendar_type)
+        return self.columns[calendar_type]
+
+    def dates(self, calendar_type, start, stop):
+        """Calendar dates of days start..stop-1 as lists, like pycalcal's."""
+        dates = self.column(calendar_type)[:, start:stop].T.tolist()
+        if calendar_type == "chinese":
+            for date in dates:
+                date[3] = bool(date[3])
+        return dates
+
+    def weeks(self, calendar_type):
+        self.column(calendar_type)
+        return WeekList(self, calendar_type)
+
+    def nbytes(self):
+        return (
+            self.fixed.nbytes
+            + self.iso_week.nbytes
+            + self.new_moon.nbytes
+            + sum(c.nbytes for c in self.columns.values())
+        )
+
+
+class WeekList(Sequence):
+    __slots__ = ("table", "calendar_type")
+
+    def __init__(self, table, calendar_type):
+        self.table = table
+        self.calendar_type = calendar_type
+
+    def __len__(self):
+        return len(self.table.iso_week)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return WeekView(self.table, self.calendar_type, i)
+
+
+class WeekView:
+    """One week of one calendar, as [details, day numbers]."""
+
+    __slots__ = ("table", "calendar_type", "index", "_days")
+
+    def __init__(self, table, calendar_type, index):
+        self.table = table
+        self.calendar_type = calendar_type
+        self.index = index
+        self._days = None
+
+    def details(self):
+        table = self.table
+        start = 7 * self.index
+        fixed = table.fixed[start : start + 7].tolist()
+        week_data = {
+            "iso": int(table.iso_week[self.index]),
+            "raw": list(zip(fixed, table.dates("gregorian", start, start + 7))),
+        }
+        moons = np.flatnonzero(table.new_moon[start : start + 7])
+        if len(moons):
+            j = int(moons[-1])
+            week_data["new_moon"] = table.dates(
+                self.calendar_type, start + j, start + j + 1
+            )[0]
+            week_data["new_moon_fixed"] = fixed[j]
+        return week_data
+
+    def days(self):
+        # Kept, because the LaTeX formatter appends to the list it is given.
+        if self._days is None:
+            start = 7 * self.index
+            self._days = self.table.column(self.calendar_type)[
+                -1, start : start + 7
+            ].tolist()
+        return self._days
+
+    def __getitem__(self, i):
+        return [self.details, self.days][i]()
+
+    def __iter__(self):
+        yield self.details()
+        yield self.days()
+
+    def __len__(self):
+        return 2
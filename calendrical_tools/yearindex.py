@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Year-structure index for the Hebrew, Islamic and Chinese calendars.
+
+A YearIndex holds, for every calendar year overlapping a span of Gregorian
+years, the fixed date of its new year, the first day, number and length of
+each of its months, and its leap flags: for the Hebrew calendar also whether
+the year is deficient or abundant, and for the Chinese calendar which month
+is the leap month. Months are kept in one flat array in date order, so a
+fixed date converts with one binary search over the month starts plus
+arithmetic, and month lengths and year types are lookups.
+
+    index = get_default_index("hebrew")
+    index.from_fixed(pcc.fixed_from_gregorian([2020, 1, 1]))  # [5780, 10, 4]
+    index.month_length(5780, 12)                              # 29
+    index.is_deficient(5780)                                  # False
+
+Chinese years are counted as elapsed years, 60 * (cycle - 1) + year, as in
+pcc.chinese_from_fixed. The Hebrew and Islamic structure is arithmetic and
+cheap for long spans; the Chinese one needs the astronomy of every month, so
+its default span is shorter.
+"""
+
+import numpy as np
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import batch
+
+# Gregorian years each calendar's shared index covers at first.
+default_spans = {
+    "hebrew": (1600, 2400),
+    "islamic": (1600, 2400),
+    "chinese": (1900, 2100),
+}
+
+
+def hebrew_structure(start, end):
+    first = int(batch.hebrew_from_fixed([start])[0][0])
+    last = int(batch.hebrew_from_fixed([end - 1])[0][0])
+    years = np.arange(first, last + 1)
+    new_year, offsets, year_length = batch.hebrew_month_starts(years)
+    lengths = np.diff(
+        np.concatenate([offsets, year_length[:, None]], axis=1), axis=1
+    )
+    # Adar II has no days in common years and is left out.
+    present = lengths > 0
+    return {
+        "years": years,
+        "new_years": np.append(new_year, new_year[-1] + year_length[-1]),
+        "month_starts": (new_year[:, None] + offsets)[present],
+        "month_numbers": np.broadcast_to(batch.hebrew_civil_months, offsets.shape)[
+            present
+        ],
+        "month_years": np.broadcast_to(years[:, None], offsets.shape)[present],
+        "month_leaps": np.zeros(present.sum(), dtype=bool),
+        "leap": batch.is_hebrew_leap_year(years),
+        "deficient": np.isin(year_length, [353, 383]),
+        "abundant": np.isin(year_length, [355, 385]),
+    }
+
+
+def islamic_structure(start, end):
+    first = int(batch.islamic_from_fixed([start])[0][0])
+    last = int(batch.islamic_from_fixed([end - 1])[0][0])
+    years = np.arange(first, last + 2)
+    starts = batch.fixed_from_islamic(years[:, None], np.arange(1, 13), 1)
+    new_years = starts[:, 0]
+    years, starts = years[:-1], starts[:-1]
+    months = np.broadcast_to(np.arange(1, 13), starts.shape)
+    return {
+        "years": years,
+        "new_years": new_years,
+        "month_starts": starts.ravel(),
+        "month_numbers": months.ravel(),
+        "month_years": np.repeat(years, 12),
+        "month_leaps": np.zeros(starts.size, dtype=bool),
+        "leap": np.diff(new_years) == 355,
+        "deficient": np.zeros(len(years), dtype=bool),
+        "abundant": np.zeros(len(years), dtype=bool),
+    }
+
+
+def chinese_elapsed_years(dates, months):
+    """Elapsed years of dates in months, as pcc.chinese_from_fixed counts them."""
+    return np.floor(
+        1.5 - (months / 12) + ((dates - pcc.CHINESE_EPOCH) / pcc.MEAN_TROPICAL_YEAR)
+    ).astype(np.int64)
+
+
+def chinese_structure(start, end):
+    # Pad by a year each way, so that the years holding start and end are
+    # complete from new year to new year.
+    starts, months, leaps = batch.chinese_months(start - 400, end + 400)
+    is_new_year = (months == 1) & ~leaps
+    first, last = np.flatnonzero(is_new_year)[[0, -1]]
+    new_years = starts[is_new_year]
+    starts, months, leaps = starts[first:last], months[first:last], leaps[first:last]
+    years = chinese_elapsed_years(new_years[:-1], 1)
+    year_of_month = np.cumsum(is_new_year[first:last]) - 1
+    leap_month = np.zeros(len(years), dtype=np.int64)
+    leap_month[year_of_month[leaps]] = months[leaps]
+    return {
+        "years": years,
+        "new_years": new_years,
+        "month_starts": starts,
+        "month_numbers": months,
+        "month_years": years[year_of_month],
+        "month_leaps": leaps,
+        "leap": leap_month > 0,
+        "deficient": np.zeros(len(years), dtype=bool),
+        "abundant": np.zeros(len(years), dtype=bool),
+        "leap_month": leap_month,
+    }
+
+
+structures = {
+    "hebrew": hebrew_structure,
+    "islamic": islamic_structure,
+    "chinese": chinese_structure,
+}
+
+
+class YearIndex:
+    def __init__(self, calendar_type, start_year=1600, end_year=2400):
+        if calendar_type not in structures:
+            raise ValueError("no year index for calendar type %s" % calendar_type)
+        self.calendar_type = calendar_type
+        self.start_year = start_year
+        self.end_year = end_year
+        start = int(batch.fixed_from_gregorian(start_year, 1, 1))
+        end = int(batch.fixed_from_gregorian(end_year + 1, 1, 1))
+        structure = structures[calendar_type](start, end)
+        self.years = structure["years"]
+        self.new_years = structure["new_years"]
+        self.month_starts = structure["month_starts"]
+        self.month_numbers = structure["month_numbers"]
+        self.month_years = structure["month_years"]
+        self.month_leaps = structure["month_leaps"]
+        self.month_lengths = np.diff(np.append(self.month_starts, self.new_years[-1]))
+        # Index of each year's first month in the month arrays.
+        self.year_months = np.searchsorted(self.month_starts, self.new_years)
+        self.leap = structure["leap"]
+        self.deficient = structure["deficient"]
+        self.abundant = structure["abundant"]
+        self.leap_month = structure.get("leap_month")
+
+    def covers(self, dates):
+        dates = np.asarray(dates)
+        return bool(
+            ((dates >= self.new_years[0]) & (dates < self.new_years[-1])).all()
+        )
+
+    def columns(self, dates):
+        """
+        Columns for an array of fixed dates, as batch.from_fixed_functions
+        returns them: (year, month, day), or for the Chinese calendar (cycle,
+        year, month, leap, day).
+        """
+        dates = np.asarray(dates, dtype=np.int64)
+        if not self.covers(dates):
+            raise ValueError(
+                "dates are outside the {} index for years {} to {}".format(
+                    self.calendar_type, self.start_year, self.end_year
+                )
+            )
+        i = np.searchsorted(self.month_starts, dates, side="right") - 1
+        month = self.month_numbers[i]
+        day = dates - self.month_starts[i] + 1
+        if self.calendar_type != "chinese":
+            return self.month_years[i], month, day
+        elapsed_years = chinese_elapsed_years(dates, month)
+        cycle = 1 + (elapsed_years - 1) // 60
+        year = (elapsed_years - 1) % 60 + 1
+        return cycle, year, month, self.month_leaps[i], day
+
+    def from_fixed(self, date):
+        """One fixed date as a list, like the calendar's pcc from_fixed."""
+        date = [c[0].item() for c in self.columns([date])]
+        if self.calendar_type == "chinese":
+            date[3] = bool(date[3])
+        return date
+
+    def _year(self, year):
+        i = year - int(self.years[0])
+        if not 0 <= i < len(self.years):
+            raise ValueError(
+                "year {} is outside the {} index for years {} to {}".format(
+                    year, self.calendar_type, self.start_year, self.end_year
+                )
+            )
+        return i
+
+    def new_year(self, year):
+        return int(self.new_years[self._year(year)])
+
+    def year_length(self, year):
+        i = self._year(year)
+        return int(self.new_years[i + 1] - self.new_years[i])
+
+    def months(self, year):
+        """(month, leap, first day, length) of each month of year, in order."""
+        i = self._year(year)
+        months = slice(self.year_months[i], self.year_months[i + 1])
+        return list(
+            zip(
+                self.month_numbers[months].tolist(),
+                self.month_leaps[months].tolist(),
+                self.month_starts[months].tolist(),
+                self.month_lengths[months].tolist(),
+            )
+        )
+
+    def month_length(self, year, month, leap=False):
+        for number, is_leap, _, length in self.months(year):
+            if number == month and is_leap == leap:
+                return length
+        raise ValueError("year {} has no month {}".format(year, month))
+
+    def is_leap(self, year):
+        return bool(self.leap[self._year(year)])
+
+    def is_deficient(self, year):
+        return bool(self.deficient[self._year(year)])
+
+    def is_abundant(self, year):
+        return bool(self.abundant[self._year(year)])
+
+    def leap_month_of(self, year):
+        """Number of the Chinese year's leap month, or 0 if it has none."""
+        return int(self.leap_month[self._year(year)])
+
+
+default_indexes = {}
+
+
+def get_default_index(calendar_type, year=None):
+    """
+    The shared YearIndex for calendar_type, rebuilt to cover the Gregorian
+    year year if it is outside the current one.
+    """
+    index = default_indexes.get(calendar_type)
+    if index is None:
+        start_year, end_year = default_spans[calendar_type]
+    else:
+        start_year, end_year = index.start_year, index.end_year
+    if year is not None:
+        start_year, end_year = min(start_year, year), max(end_year, year)
+    if index is None or (start_year, end_year) != (index.start_year, index.end_year):
+        index = default_indexes[calendar_type] = YearIndex(
+            calendar_type, start_year, end_year
+        )
+    return index
@@ -1,16 +1,24 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import contextlib
 import datetime
+import functools
 import json
+import logging
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from jinja2 import Template
-from tqdm import tqdm
 import click
 
 from pycalcal import pycalcal as pcc
+from calendrical_tools import astronomy
 from calendrical_tools import candybar
+from calendrical_tools import instrument
+from calendrical_tools import yearindex
 
 
 from_fixed_functions = {
@@ -49,12 +57,13 @@ template_text = r"""
 template = Template(template_text)
 
 
-@click.command()
-@click.option("--start", default=1, help="ISO week number.")
-@click.option("--year", default=2020, help="The calendar year.")
-def main(year=2020, start=None):
+def render_year(year, almanac=None):
+    """
+    Write the LaTeX candybar for one year to output/cal_<year>.tex, reading
+    its days and new moons from the almanac file almanac if one is given.
+    """
     year = int(year)
-    cal = candybar.LaTeXCandyBar(year)
+    cal = candybar.LaTeXCandyBar(year, almanac=almanac)
     new_moons = cal.new_moons
 
     formatted_weeks = []
@@ -77,38 +86,182 @@ def main(year=2020, start=None):
     lunar_template = Template(lunar_template_text)
     lunar_tab = lunar_template.render(weeks=formatted_weeks)
 
-    # Hebrew calendar year
-    hstart = pcc.standard_year(
-        pcc.hebrew_from_fixed(pcc.fixed_from_gregorian([year, 1, 1]))
-    )
-    hend = pcc.standard_year(
-        pcc.hebrew_from_fixed(pcc.fixed_from_gregorian([year, 12, 1]))
-    )
-
-    # Islamic calendar year
-    istart = pcc.standard_year(
-        pcc.islamic_from_fixed(pcc.fixed_from_gregorian([year, 1, 1]))
-    )
-    iend = pcc.standard_year(
-        pcc.islamic_from_fixed(pcc.fixed_from_gregorian([year, 12, 1]))
-    )
+    # Hebrew and Islamic calendar years at the start and end of the year
+    jan1 = pcc.fixed_from_gregorian([year, 1, 1])
+    dec1 = pcc.fixed_from_gregorian([year, 12, 1])
+    hebrew = yearindex.get_default_index("hebrew", year)
+    hstart, hend = (pcc.standard_year(hebrew.from_fixed(d)) for d in (jan1, dec1))
+    islamic = yearindex.get_default_index("islamic", year)
+    istart, iend = (pcc.standard_year(islamic.from_fixed(d)) for d in (jan1, dec1))
 
     year_display = r"{}& Phases & {}/{}& {}/{}&{}".format(
         year, hstart, hend, istart, iend, year
     )
 
-    output = template.render(
-        year_display=year_display,
-        gregorian_data=cal.prweeks(cal.weeks["gregorian"], new_moons),
-        lunar_data=lunar_tab,
-        hebrew_data=cal.prweeks(cal.weeks["hebrew"], new_moons),
-        islamic_data=cal.prweeks(cal.weeks["islamic"], new_moons),
-        chinese_data=cal.prweeks(cal.weeks["chinese"], new_moons),
-    )
+    weeks = {cal_type: cal.weeks[cal_type] for cal_type in cal.calendars}
+    with instrument.span("render.template"):
+        output = template.render(
+            year_display=year_display,
+            gregorian_data=cal.prweeks(weeks["gregorian"], new_moons),
+            lunar_data=lunar_tab,
+            hebrew_data=cal.prweeks(weeks["hebrew"], new_moons),
+            islamic_data=cal.prweeks(weeks["islamic"], new_moons),
+            chinese_data=cal.prweeks(weeks["chinese"], new_moons),
+        )
 
     outfile = "output/cal_" + str(year) + ".tex"
-    with open(outfile, "w") as fp:
+    with instrument.span("render.write"), open(outfile, "w") as fp:
         fp.write(output)
+    return outfile
+
+
+def timed_render_year(year, timings=False, almanac=None):
+    """
+    Render one year, returning its timing and any error instead of raising.
+    With timings, the year's spans and counters are returned in
+    result["timings"], so they survive the trip back from a worker process.
+    """
+    start = time.perf_counter()
+    result = {"year": year, "outfile": None, "error": None, "timings": None}
+    with instrument.recording() if timings else contextlib.nullcontext() as timer:
+        try:
+            result["outfile"] = render_year(year, almanac)
+        except Exception:
+            result["error"] = traceback.format_exc()
+    if timings:
+        result["timings"] = timer.snapshot()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def parse_years(years):
+    """Parse "START-END" (inclusive) or a single year."""
+    start, _, end = years.partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    return list(range(start, end + 1))
+
+
+def render_years(years, jobs=1, timings=False, progress=False, almanac=None):
+    """
+    Render independent years across a pool of worker processes. Workers map
+    the almanac file themselves, so they share its pages.
+    """
+    render = functools.partial(timed_render_year, timings=timings, almanac=almanac)
+    if jobs == 1:
+        return [
+            render(year)
+            for year in instrument.progress(years, enabled=progress, unit="year")
+        ]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(
+            instrument.progress(
+                executor.map(render, years),
+                enabled=progress,
+                total=len(years),
+                unit="year",
+            )
+        )
+
+
+def format_summary(results, elapsed):
+    lines = []
+    for r in results:
+        status = "ok" if r["error"] is None else "FAILED"
+        lines.append("{:>6} {:8.2f}s  {}".format(r["year"], r["seconds"], status))
+    failures = [r for r in results if r["error"] is not None]
+    for r in failures:
+        lines.append("")
+        lines.append("{} failed:".format(r["year"]))
+        lines.append(r["error"].rstrip())
+    lines.append("")
+    lines.append(
+        "{} years, {} failed, {:.2f}s elapsed, {:.2f}s total worker time".format(
+            len(results), len(failures), elapsed, sum(r["seconds"] for r in results)
+        )
+    )
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option("--start", default=1, help="ISO week number.")
+@click.option("--year", default=2020, help="The calendar year.")
+@click.option(
+    "--years",
+    default=None,
+    help="Range of years to render, e.g. 2020-2030.",
+)
+@click.option(
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes for --years.",
+)
+@click.option("--progress", is_flag=True, help="Show a progress bar for --years.")
+@click.option(
+    "--timings",
+    default=None,
+    help="Log stage timings and write them to this JSON file.",
+)
+@click.option(
+    "--profile",
+    default=None,
+    help="Write cProfile stats for the run to this file.",
+)
+@click.option(
+    "--astronomy-store",
+    default=None,
+    help="Shelve file that keeps memoized astronomy between runs (--jobs 1 only).",
+)
+@click.option(
+    "--almanac",
+    default=None,
+    help="Almanac file (see calendrical_tools.almanac) to read days from.",
+)
+def main(
+    year=2020,
+    start=None,
+    years=None,
+    jobs=1,
+    progress=False,
+    timings=None,
+    profile=None,
+    astronomy_store=None,
+    almanac=None,
+):
+    if astronomy_store is not None:
+        if jobs != 1:
+            raise click.UsageError(
+                "--astronomy-store cannot be shared by --jobs workers"
+            )
+        astronomy.configure(store_path=astronomy_store)
+    timer = instrument.Timer()
+    profiler = instrument.profiled(profile) if profile else contextlib.nullcontext()
+    with profiler, instrument.recording(timer):
+        if years is None:
+            render_year(int(year), almanac)
+            results = []
+        else:
+            started = time.perf_counter()
+            results = render_years(
+                parse_years(years),
+                jobs=jobs,
+                timings=bool(timings),
+                progress=progress,
+                almanac=almanac,
+            )
+            for r in results:
+                if r["timings"] is not None:
+                    timer.merge(r["timings"])
+            click.echo(format_summary(results, time.perf_counter() - started))
+
+    if timings:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        instrument.log_report(timer)
+        instrument.write_json(timer, timings)
+    astronomy.get_default_memo().close()
+    if any(r["error"] is not None for r in results):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
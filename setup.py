@@ -13,6 +13,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/rn123/Calendrial-Tools",
     packages=setuptools.find_packages(),
+    package_data={"calendrical_tools": ["data/*.csv"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
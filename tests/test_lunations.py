@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from pycalcal import pycalcal as pcc
+from calendrical_tools import astronomy
+from calendrical_tools import candybar
+from calendrical_tools import export
+from calendrical_tools import lunations
+
+
+@pytest.fixture
+def small_table(monkeypatch):
+    table = lunations.NewMoonTable(2000, 2001)
+    monkeypatch.setattr(lunations, "default_table", table)
+    return table
+
+
+def new_moons(a, b):
+    """New moons with a <= moment < b, one pcc.nth_new_moon at a time."""
+    n = int((a - pcc.nth_new_moon(0)) // pcc.MEAN_SYNODIC_MONTH) - 2
+    moons = []
+    while True:
+        moment = astronomy.nth_new_moon(n)
+        if moment >= b:
+            return moons
+        if moment >= a:
+            moons.append((n, moment))
+        n += 1
+
+
+def check_between(table, a, b):
+    numbers, moments = table.between(a, b)
+    expected = new_moons(a, b)
+    assert numbers.tolist() == [n for n, _ in expected]
+    np.testing.assert_array_equal(moments, [m for _, m in expected])
+
+
+@pytest.mark.parametrize("year", [1999, 2000, 2001, 2002, 2010, 1990])
+def test_between(year):
+    table = lunations.NewMoonTable(2000, 2001)
+    start = pcc.fixed_from_gregorian([year, 1, 1]) - 28
+    end = pcc.fixed_from_gregorian([year + 1, 1, 1]) + 28
+    check_between(table, start, end)
+
+
+def test_grows_keeping_moments():
+    table = lunations.NewMoonTable(2000, 2001)
+    n = table.first + 5
+    moment = table.moment(n)
+    table.extend_years(1990, 2010)
+    assert table.start_year == 1990 and table.end_year == 2010
+    assert table.moments[n - table.first] == moment
+    assert table.moment(table.first) == astronomy.nth_new_moon(table.first)
+
+
+@pytest.mark.parametrize("year", [2000, 2001, 2005, 1995])
+@pytest.mark.parametrize("weeks", [(1, 0), (8, 8)])
+def test_candybar_new_moons(small_table, year, weeks):
+    cal = candybar.CandyBar(
+        year, weeks_before=weeks[0], weeks_after=weeks[1], cache=False
+    )
+    start, end = cal.window_range(year)
+    moons = cal.new_moons_in_year(year)
+    expected = new_moons(start, end)
+    assert [m.moon_since_1_1 for m in moons.values()] == [n for n, _ in expected]
+    assert list(moons) == [int(m) for _, m in expected]
+
+
+@pytest.mark.parametrize("year", [2001, 2005])
+def test_export_new_moons(small_table, year):
+    start = pcc.fixed_from_gregorian([year, 11, 1])
+    end = pcc.fixed_from_gregorian([year + 1, 3, 1])
+    days = list(export.day_columns(start, end, ["gregorian"], chunk=30))
+    moments = np.concatenate([day["new_moon_moment"] for day in days])
+    np.testing.assert_array_equal(
+        moments[~np.isnan(moments)], [m for _, m in new_moons(start, end)]
+    )
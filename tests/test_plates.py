@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from calendrical_tools import plates
+
+latitudes = [5.0, 23.5, 36.0, 51.5, 66.0]
+radius_equator = plates.radius_equator_for(23.4443291, 100)
+
+
+def circle_points(cx, cy, r, n=360):
+    t = np.radians(np.arange(n) * 360.0 / n)
+    return cx + r * np.cos(t), cy + r * np.sin(t)
+
+
+def forward(latitude, altitudes=range(0, 90, 10), azimuths=range(10, 90, 10)):
+    return plates.PlateSet([latitude], altitudes, azimuths, radius_equator)
+
+
+@pytest.mark.parametrize("latitude", latitudes)
+def test_round_trip(latitude):
+    alt, az = np.meshgrid(np.arange(-30.0, 90.0, 7.5), np.arange(0.0, 360.0, 15.0))
+    x, y = plates.horizontal_to_plate(alt, az, latitude, radius_equator)
+    alt2, az2, _, _ = plates.plate_to_horizontal(x, y, latitude, radius_equator)
+    np.testing.assert_allclose(alt2, alt, atol=1e-9)
+    np.testing.assert_allclose((az2 - az + 180) % 360 - 180, 0, atol=1e-9)
+
+
+@pytest.mark.parametrize("latitude", latitudes)
+def test_horizon(latitude):
+    plate = forward(latitude)
+    x, y = circle_points(0, plate.horizon_cy[0], plate.horizon_r[0])
+    alt, _, _, _ = plates.plate_to_horizontal(x, y, latitude, radius_equator)
+    np.testing.assert_allclose(alt, 0, atol=1e-9)
+
+
+@pytest.mark.parametrize("latitude", latitudes)
+def test_almucantars(latitude):
+    plate = forward(latitude)
+    for altitude, cy, r in zip(
+        plate.altitudes, plate.almucantar_cy[0], plate.almucantar_r[0]
+    ):
+        x, y = circle_points(0, cy, r)
+        alt, _, _, _ = plates.plate_to_horizontal(x, y, latitude, radius_equator)
+        np.testing.assert_allclose(alt, altitude, atol=1e-9)
+
+
+@pytest.mark.parametrize("latitude", latitudes)
+def test_azimuths(latitude):
+    plate = forward(latitude)
+    cy = plate.azimuth_cy[0]
+    for az, cx, r in zip(plate.azimuths, plate.azimuth_cx[0], plate.azimuth_r[0]):
+        # The circle centred at cx is the vertical through 90 - az and
+        # 270 - az; its mirror image at -cx is the one through 90 + az and
+        # 270 + az.
+        for centre, expected in ((cx, (90 - az, 270 - az)), (-cx, (90 + az, 270 + az))):
+            x, y = circle_points(centre, cy, r)
+            alt, azimuth, _, _ = plates.plate_to_horizontal(
+                x, y, latitude, radius_equator
+            )
+            # Away from the zenith and nadir, where azimuth is undefined.
+            above = np.abs(alt) < 85
+            error = np.min(
+                [np.abs((azimuth[above] - e + 180) % 360 - 180) for e in expected],
+                axis=0,
+            )
+            np.testing.assert_allclose(error, 0, atol=1e-7)
+
+
+@pytest.mark.parametrize("latitude", latitudes)
+def test_prime_vertical(latitude):
+    plate = forward(latitude)
+    x, y = circle_points(0, plate.prime_vertical_cy[0], plate.prime_vertical_r[0])
+    alt, azimuth, _, _ = plates.plate_to_horizontal(x, y, latitude, radius_equator)
+    above = np.abs(alt) < 85
+    error = np.minimum(
+        np.abs((azimuth[above] - 90 + 180) % 360 - 180),
+        np.abs((azimuth[above] - 270 + 180) % 360 - 180),
+    )
+    np.testing.assert_allclose(error, 0, atol=1e-7)